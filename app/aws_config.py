@@ -8,13 +8,15 @@ class AWSConfig:
         self.aws_secret_access_key = os.getenv("AWS_SECRET_ACCESS_KEY")
         self.aws_region = os.getenv("AWS_REGION", "us-east-1")
         self.bucket_name = os.getenv("AWS_BUCKET_NAME", "weave-videos")
+        self.endpoint_url = os.getenv("S3_ENDPOINT_URL")  # Local object store (e.g. MinIO); unset for AWS
         
         # Initialize S3 client
         self.s3_client = boto3.client(
             's3',
             aws_access_key_id=self.aws_access_key_id,
             aws_secret_access_key=self.aws_secret_access_key,
-            region_name=self.aws_region
+            region_name=self.aws_region,
+            endpoint_url=self.endpoint_url
         )
         
         # Initialize S3 resource for more advanced operations
@@ -22,7 +24,8 @@ class AWSConfig:
             's3',
             aws_access_key_id=self.aws_access_key_id,
             aws_secret_access_key=self.aws_secret_access_key,
-            region_name=self.aws_region
+            region_name=self.aws_region,
+            endpoint_url=self.endpoint_url
         )
     
     def create_bucket_if_not_exists(self):
@@ -0,0 +1,168 @@
+"""
+Compile executors
+
+Every backend takes the same payload the Lambda receives and runs the same
+engine (lambda_function.lambda_handler), so compiles can be run and measured
+without AWS:
+
+- lambda: asynchronous invocation of the deployed function (production)
+- local:  a process pool on this machine, one compile per worker process
+- sync:   runs the compile inline in the calling thread (tests, scripts)
+
+The backend is picked with COMPILE_EXECUTOR. For a fully local setup point
+S3_ENDPOINT_URL at a local object store (e.g. MinIO) for both the app and
+the engine.
+"""
+
+import json
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Any
+
+import boto3
+from botocore.config import Config
+
+COMPILE_EXECUTOR = os.getenv("COMPILE_EXECUTOR", "lambda")
+LAMBDA_FUNCTION_NAME = os.getenv("LAMBDA_FUNCTION_NAME", "weave-video-processor")
+LOCAL_COMPILE_WORKERS = int(os.getenv("LOCAL_COMPILE_WORKERS", str(os.cpu_count() or 2)))
+# Same ceiling as the deployed function, so time-budget decisions behave alike
+LOCAL_COMPILE_TIMEOUT = int(os.getenv("LOCAL_COMPILE_TIMEOUT", "900"))
+
+class LocalContext:
+    """The parts of the Lambda context object the engine reads"""
+
+    def __init__(self, timeout_seconds: int = LOCAL_COMPILE_TIMEOUT):
+        region = os.getenv("AWS_REGION", "us-east-1")
+        self.function_name = LAMBDA_FUNCTION_NAME
+        self.invoked_function_arn = f"arn:aws:lambda:{region}:000000000000:function:{self.function_name}"
+        self.aws_request_id = str(uuid.uuid4())
+        self.memory_limit_in_mb = 0
+        self._deadline = time.monotonic() + timeout_seconds
+
+    def get_remaining_time_in_millis(self) -> int:
+        return max(0, int((self._deadline - time.monotonic()) * 1000))
+
+def run_compile(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Run one compile in this process and return the handler's response"""
+    # Imported here so worker processes load the engine themselves
+    from lambda_function import lambda_handler
+    return lambda_handler(payload, LocalContext())
+
+class CompileExecutor:
+    """Runs compile payloads; submit() returns immediately, run() waits for the result"""
+
+    name = "base"
+
+    def submit(self, payload: Dict[str, Any]):
+        raise NotImplementedError
+
+    def run(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        raise NotImplementedError
+
+class LambdaCompileExecutor(CompileExecutor):
+    name = "lambda"
+
+    def __init__(self, function_name: str = LAMBDA_FUNCTION_NAME):
+        self.function_name = function_name
+        self.lambda_client = boto3.client(
+            'lambda',
+            aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
+            aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
+            region_name=os.getenv("AWS_REGION", "us-east-1"),
+            # run() waits for the whole compile; retries belong to the job queue, not the SDK
+            config=Config(read_timeout=LOCAL_COMPILE_TIMEOUT + 60, retries={'max_attempts': 0})
+        )
+
+    def submit(self, payload: Dict[str, Any]):
+        self.lambda_client.invoke(
+            FunctionName=self.function_name,
+            InvocationType='Event',  # Asynchronous invocation
+            Payload=json.dumps(payload)
+        )
+
+    def run(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        response = self.lambda_client.invoke(
+            FunctionName=self.function_name,
+            InvocationType='RequestResponse',
+            Payload=json.dumps(payload)
+        )
+        return json.loads(response['Payload'].read())
+
+class LocalCompileExecutor(CompileExecutor):
+    name = "local"
+
+    def __init__(self, max_workers: int = LOCAL_COMPILE_WORKERS):
+        self.max_workers = max_workers
+        self.lock = threading.Lock()
+        self.pool = self._new_pool()
+
+    def _new_pool(self) -> ProcessPoolExecutor:
+        # spawn, not fork: the API process has threads (ingest pool, uvicorn) that must not be copied
+        return ProcessPoolExecutor(max_workers=self.max_workers, mp_context=multiprocessing.get_context("spawn"))
+
+    def _replace_pool(self, broken: ProcessPoolExecutor):
+        """A crashed worker process breaks the whole pool for good; start a fresh one"""
+        with self.lock:
+            if self.pool is broken:
+                print("⚠️ Local compile pool broke (a worker process died), starting a new one")
+                broken.shutdown(wait=False, cancel_futures=True)
+                self.pool = self._new_pool()
+
+    def _submit(self, payload: Dict[str, Any]):
+        pool = self.pool
+        try:
+            return pool, pool.submit(run_compile, payload)
+        except BrokenProcessPool:
+            self._replace_pool(pool)
+            pool = self.pool
+            return pool, pool.submit(run_compile, payload)
+
+    def submit(self, payload: Dict[str, Any]):
+        _, future = self._submit(payload)
+        future.add_done_callback(_log_failure)
+        return future
+
+    def run(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        pool, future = self._submit(payload)
+        try:
+            return future.result()
+        except BrokenProcessPool:
+            # This compile (or one beside it) took the pool down; retry once on a new pool
+            self._replace_pool(pool)
+            return self.pool.submit(run_compile, payload).result()
+
+class SyncCompileExecutor(CompileExecutor):
+    name = "sync"
+
+    def submit(self, payload: Dict[str, Any]):
+        return run_compile(payload)
+
+    def run(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        return run_compile(payload)
+
+def _log_failure(future):
+    if future.exception():
+        print(f"❌ Local compile crashed: {future.exception()}")
+
+EXECUTORS = {
+    "lambda": LambdaCompileExecutor,
+    "local": LocalCompileExecutor,
+    "sync": SyncCompileExecutor,
+}
+
+_executor = None
+
+def get_compile_executor() -> CompileExecutor:
+    """The executor selected by COMPILE_EXECUTOR, created on first use"""
+    global _executor
+    if _executor is None:
+        if COMPILE_EXECUTOR not in EXECUTORS:
+            raise ValueError(f"Unknown COMPILE_EXECUTOR '{COMPILE_EXECUTOR}', expected one of {', '.join(EXECUTORS)}")
+        _executor = EXECUTORS[COMPILE_EXECUTOR]()
+        print(f"🎬 Compile executor: {_executor.name}")
+    return _executor
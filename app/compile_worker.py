@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Compilation worker
+
+Drains the compilation_jobs queue through the configured compile executor
+(COMPILE_EXECUTOR). Run as many as needed; they coordinate through the
+database only:
+
+    python -m app.compile_worker          # run until stopped
+    python -m app.compile_worker --once   # drain the queue and exit
+"""
+
+import json
+import os
+import signal
+import socket
+import sys
+import threading
+import uuid
+from typing import Optional
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database import SessionLocal
+from app.job_queue import claim_job, heartbeat, finish_job, JOB_LEASE_SECONDS
+from app.compile_executor import get_compile_executor
+
+WORKER_POLL_SECONDS = float(os.getenv("WORKER_POLL_SECONDS", "5"))
+
+stopping = threading.Event()
+
+def run_job(job_id: int, payload: dict, worker_id: str) -> Optional[str]:
+    """Run one job while a side thread keeps its lease alive; returns the error, if any"""
+    done = threading.Event()
+
+    def keep_lease():
+        db = SessionLocal()
+        try:
+            while not done.wait(JOB_LEASE_SECONDS / 3):
+                try:
+                    if not heartbeat(db, job_id, worker_id):
+                        print(f"⚠️ Lost lease on job {job_id}, its result will be discarded")
+                        return
+                except Exception as e:
+                    # A missed beat is fine as long as the next one lands before the lease runs out
+                    print(f"⚠️ Heartbeat failed for job {job_id}: {e}")
+                    db.rollback()
+        finally:
+            db.close()
+
+    beat = threading.Thread(target=keep_lease, daemon=True)
+    beat.start()
+    try:
+        # job_id tells the engine the queue owns the compilation's failed status
+        response = get_compile_executor().run(dict(payload, job_id=job_id))
+        if response.get('statusCode') != 200:
+            return json.loads(response.get('body') or '{}').get('error', f"statusCode {response.get('statusCode')}")
+        return None
+    except Exception as e:
+        return str(e)
+    finally:
+        done.set()
+        beat.join()
+
+def work(worker_id: str, once: bool = False):
+    print(f"👷 Compile worker {worker_id} started")
+    while not stopping.is_set():
+        db = SessionLocal()
+        try:
+            job = claim_job(db, worker_id)
+            if job:
+                job_id, attempts = job.id, job.attempts
+                payload = json.loads(job.payload)
+        except Exception as e:
+            # A database blip shouldn't take the worker down; try again after the usual pause
+            print(f"⚠️ Could not claim a job: {e}")
+            db.rollback()
+            stopping.wait(WORKER_POLL_SECONDS)
+            continue
+        finally:
+            db.close()
+
+        if not job:
+            if once:
+                break
+            stopping.wait(WORKER_POLL_SECONDS)
+            continue
+
+        print(f"🎬 Job {job_id} (compilation {payload.get('compilation_id')}), attempt {attempts}")
+        error = run_job(job_id, payload, worker_id)
+
+        db = SessionLocal()
+        try:
+            outcome = finish_job(db, job_id, worker_id, error)
+        except Exception as e:
+            # The lease runs out and the job is reclaimed, so the attempt is only repeated
+            print(f"⚠️ Could not record the outcome of job {job_id}: {e}")
+            db.rollback()
+            continue
+        finally:
+            db.close()
+
+        if outcome == "succeeded":
+            print(f"✅ Job {job_id} succeeded")
+        elif outcome == "queued":
+            print(f"🔁 Job {job_id} failed, will retry: {error}")
+        elif outcome == "dead":
+            print(f"💀 Job {job_id} dead-lettered after {attempts} attempts: {error}")
+        else:
+            print(f"⚠️ Job {job_id} was reclaimed by another worker, discarding result")
+
+    print(f"👋 Compile worker {worker_id} stopped")
+
+def main():
+    worker_id = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+    # Finish the current job, then exit
+    signal.signal(signal.SIGTERM, lambda *_: stopping.set())
+    signal.signal(signal.SIGINT, lambda *_: stopping.set())
+    work(worker_id, once="--once" in sys.argv)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Post-upload processing for video submissions
+
+Each upload is probed, given a poster and scrubbing sprite, and converted to
+the compilation's intermediate profile in a worker pool right after it lands
+in S3, so the weekly compile only has to concatenate clips instead of
+re-encoding the whole week at once. The probe is stored on the submission so
+neither the API nor the compile has to read the file again, and uploads
+ffprobe can't make sense of are marked invalid.
+"""
+
+import json
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from app.aws_config import aws_config
+from app.database import SessionLocal
+from app.models.video import VideoSubmission
+from lambda_function import normalize_clip, probe_media, probe_keyframe_interval, get_ffprobe_path, render_thumbnails
+
+# Each job spends its time in an ffmpeg child process, so threads are enough
+# to keep several encodes running side by side
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))
+FFMPEG_PATH = os.getenv("FFMPEG_PATH", "ffmpeg")
+FFPROBE_PATH = get_ffprobe_path(FFMPEG_PATH)
+
+ingest_executor = ThreadPoolExecutor(max_workers=INGEST_WORKERS, thread_name_prefix="ingest")
+
+def normalized_key_for(s3_key: str) -> str:
+    """S3 key of the normalized copy of an uploaded clip"""
+    base = s3_key.rsplit('.', 1)[0]
+    return f"normalized/{base}.mp4"
+
+def thumbnail_prefix_for(s3_key: str) -> str:
+    """S3 prefix of an uploaded clip's poster and sprite"""
+    base = s3_key.rsplit('.', 1)[0]
+    return f"thumbnails/{base}"
+
+def upload_thumbnails(source_path: str, duration: float, temp_dir: str, s3_key: str) -> str:
+    """Render and upload a clip's poster and sprite; returns their prefix"""
+    prefix = thumbnail_prefix_for(s3_key)
+    for path, name, content_type in render_thumbnails(source_path, duration, os.path.join(temp_dir, "thumbs"), FFMPEG_PATH):
+        aws_config.s3_client.upload_file(path, aws_config.bucket_name, f"{prefix}/{name}", ExtraArgs={'ContentType': content_type})
+    return prefix
+
+def probe_upload(path: str) -> dict:
+    """Probe an upload; raises ValueError if it is not a usable video"""
+    probe = probe_media(FFPROBE_PATH, path)
+    if not probe['video_codec']:
+        raise ValueError("no video stream")
+    if probe['duration'] <= 0:
+        raise ValueError("zero duration")
+    return probe
+
+def apply_probe(submission: VideoSubmission, probe: dict, keyframe_interval: float):
+    """Copy the probed fields onto the submission"""
+    submission.media_status = "ok"
+    submission.video_codec = probe['video_codec']
+    submission.width = probe['width']
+    submission.height = probe['height']
+    submission.frame_rate = probe['fps']
+    submission.rotation = probe['rotation']
+    submission.has_audio = probe['audio_codec'] is not None
+    submission.bitrate = probe['bitrate']
+    submission.keyframe_interval = keyframe_interval
+    submission.duration = probe['duration']
+
+def normalize_submission(submission_id: int):
+    """Download a submission, probe it, convert it to the intermediate profile and record the results"""
+    db = SessionLocal()
+    try:
+        submission = db.query(VideoSubmission).filter(VideoSubmission.id == submission_id).first()
+        if not submission:
+            print(f"⚠️ Submission {submission_id} not found, skipping normalization")
+            return
+
+        normalized_key = normalized_key_for(submission.s3_key)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            source_path = os.path.join(temp_dir, "source")
+            output_path = os.path.join(temp_dir, "normalized.mp4")
+
+            aws_config.s3_client.download_file(aws_config.bucket_name, submission.s3_key, source_path)
+            
+            try:
+                probe = probe_upload(source_path)
+            except Exception as e:
+                submission.media_status = "invalid"
+                submission.media_info = json.dumps({'error': str(e)})
+                db.commit()
+                print(f"❌ Submission {submission_id} is not a usable video ({e}), it will be left out of compilations")
+                return
+            
+            apply_probe(submission, probe, probe_keyframe_interval(FFPROBE_PATH, source_path))
+            submission.media_info = json.dumps({'source': probe})
+            db.commit()
+            
+            # Previews first, so group screens have something to show while the encode runs
+            try:
+                submission.thumbnail_prefix = upload_thumbnails(source_path, probe['duration'], temp_dir, submission.s3_key)
+                db.commit()
+            except Exception as e:
+                print(f"⚠️ Thumbnails failed for submission {submission_id}: {e}")
+                db.rollback()
+            
+            normalize_clip(source_path, output_path, FFMPEG_PATH, probe=probe)
+            normalized_probe = probe_media(FFPROBE_PATH, output_path)
+            aws_config.s3_client.upload_file(
+                output_path,
+                aws_config.bucket_name,
+                normalized_key,
+                ExtraArgs={'ContentType': 'video/mp4'}
+            )
+
+        submission.normalized_s3_key = normalized_key
+        submission.media_info = json.dumps({'source': probe, 'normalized': normalized_probe})
+        db.commit()
+        print(f"✅ Normalized submission {submission_id}: {normalized_key}")
+
+    except Exception as e:
+        # The compile falls back to the original upload, so this is not fatal
+        print(f"❌ Error normalizing submission {submission_id}: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+def enqueue_normalization(submission_id: int):
+    """Queue a submission for normalization without blocking the request"""
+    ingest_executor.submit(normalize_submission, submission_id)
@@ -0,0 +1,141 @@
+"""
+Durable queue of compilation jobs
+
+Jobs live in the compilation_jobs table. Workers claim them with
+SELECT ... FOR UPDATE SKIP LOCKED, so concurrent workers never pick the same
+row, and hold a time-limited lease that they extend with heartbeats. A job
+whose worker dies is reclaimed once its lease expires. Failed attempts are
+retried with exponential backoff; after max_attempts the job is dead-lettered
+and its compilation marked failed.
+"""
+
+import json
+import os
+import random
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Any, Optional
+
+from sqlalchemy import or_, and_
+from sqlalchemy.orm import Session
+
+from app.models.video import CompilationJob, WeeklyCompilation
+
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "120"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "5"))
+JOB_BACKOFF_BASE_SECONDS = int(os.getenv("JOB_BACKOFF_BASE_SECONDS", "30"))
+JOB_BACKOFF_MAX_SECONDS = int(os.getenv("JOB_BACKOFF_MAX_SECONDS", "1800"))
+
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+def enqueue_compilation_job(db: Session, compilation: WeeklyCompilation, payload: Dict[str, Any]) -> CompilationJob:
+    """Add a job for the compilation; committed together with the caller's transaction"""
+    job = CompilationJob(
+        compilation=compilation,
+        payload=json.dumps(payload),
+        status="queued",
+        attempts=0,
+        max_attempts=JOB_MAX_ATTEMPTS,
+        run_after=utcnow()
+    )
+    db.add(job)
+    return job
+
+def claim_job(db: Session, worker_id: str) -> Optional[CompilationJob]:
+    """
+    Lease the next runnable job: queued and due, or running with an expired
+    lease (its worker died). Returns None when the queue is empty.
+
+    A job whose worker died on its last allowed attempt never reaches
+    finish_job, so it is dead-lettered here instead of being run again.
+    """
+    while True:
+        now = utcnow()
+        job = db.query(CompilationJob).filter(
+            or_(
+                and_(CompilationJob.status == "queued", CompilationJob.run_after <= now),
+                and_(CompilationJob.status == "running", CompilationJob.lease_expires_at < now)
+            )
+        ).order_by(
+            CompilationJob.run_after, CompilationJob.id
+        ).with_for_update(skip_locked=True).first()
+
+        if not job:
+            db.commit()
+            return None
+
+        if job.status == "running" and (job.attempts or 0) >= job.max_attempts:
+            job.status = "dead"
+            job.lease_expires_at = None
+            job.last_error = f"Lease expired on attempt {job.attempts} of {job.max_attempts}"
+            job.finished_at = now
+            job.compilation.status = "failed"
+            db.commit()
+            print(f"💀 Job {job.id} dead-lettered: {job.last_error}")
+            continue
+        break
+
+    job.status = "running"
+    job.worker_id = worker_id
+    job.attempts = (job.attempts or 0) + 1
+    job.lease_expires_at = now + timedelta(seconds=JOB_LEASE_SECONDS)
+    job.compilation.status = "processing"
+    # A retry starts over; don't show the failed attempt's progress
+    job.compilation.progress = None
+    db.commit()
+    return job
+
+def heartbeat(db: Session, job_id: int, worker_id: str) -> bool:
+    """Extend the lease; False means the lease was lost (reclaimed or the job was deleted)"""
+    updated = db.query(CompilationJob).filter(
+        CompilationJob.id == job_id,
+        CompilationJob.worker_id == worker_id,
+        CompilationJob.status == "running"
+    ).update(
+        {CompilationJob.lease_expires_at: utcnow() + timedelta(seconds=JOB_LEASE_SECONDS)},
+        synchronize_session=False
+    )
+    db.commit()
+    return updated == 1
+
+def retry_delay(attempts: int) -> float:
+    """Exponential backoff with jitter, capped"""
+    delay = min(JOB_BACKOFF_MAX_SECONDS, JOB_BACKOFF_BASE_SECONDS * 2 ** max(0, attempts - 1))
+    return delay * random.uniform(0.5, 1.0)
+
+def finish_job(db: Session, job_id: int, worker_id: str, error: Optional[str] = None) -> Optional[str]:
+    """
+    Record the outcome of an attempt. Returns the job's new status, or None if
+    this worker no longer holds the lease (another worker owns the outcome).
+    """
+    job = db.query(CompilationJob).filter(
+        CompilationJob.id == job_id,
+        CompilationJob.worker_id == worker_id,
+        CompilationJob.status == "running"
+    ).with_for_update().first()
+
+    if not job:
+        db.commit()
+        return None
+
+    now = utcnow()
+    job.lease_expires_at = None
+    if error is None:
+        job.status = "succeeded"
+        job.last_error = None
+        job.finished_at = now
+    elif job.attempts >= job.max_attempts:
+        job.status = "dead"
+        job.last_error = error
+        job.finished_at = now
+        job.compilation.status = "failed"
+    else:
+        job.status = "queued"
+        job.last_error = error
+        job.run_after = now + timedelta(seconds=retry_delay(job.attempts))
+        # Still in flight from the user's point of view
+        job.compilation.status = "processing"
+        job.compilation.completed_at = None
+        job.compilation.progress = None
+    db.commit()
+    return job.status
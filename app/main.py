@@ -1,7 +1,10 @@
 from fastapi import FastAPI, HTTPException, Depends, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from sqlalchemy import text
 from sqlalchemy.orm import Session
+from anyio import to_thread
+import os
 import uvicorn
 
 from app.database import get_db, engine, Base
@@ -11,19 +14,55 @@ from app.models import user, group, video, prompt
 # Create database tables
 Base.metadata.create_all(bind=engine)
 
+# Routes are plain `def`: their blocking SQLAlchemy and boto3 calls run in AnyIO's
+# worker threads instead of on the event loop. This caps those threads per process.
+API_THREADPOOL_SIZE = int(os.getenv("API_THREADPOOL_SIZE", "40"))
+
 # Minimal column migration for new fields (idempotent)
+# (table, column, PostgreSQL type, SQLite type)
+ADDED_COLUMNS = [
+    ("groups", "deadline_at", "TIMESTAMPTZ", "DATETIME"),
+    ("video_submissions", "normalized_s3_key", "VARCHAR", "VARCHAR"),
+    ("weekly_compilations", "fingerprint", "VARCHAR", "VARCHAR"),
+    ("video_submissions", "media_status", "VARCHAR", "VARCHAR"),
+    ("video_submissions", "video_codec", "VARCHAR", "VARCHAR"),
+    ("video_submissions", "width", "INTEGER", "INTEGER"),
+    ("video_submissions", "height", "INTEGER", "INTEGER"),
+    ("video_submissions", "frame_rate", "VARCHAR", "VARCHAR"),
+    ("video_submissions", "rotation", "INTEGER", "INTEGER"),
+    ("video_submissions", "has_audio", "BOOLEAN", "BOOLEAN"),
+    ("video_submissions", "bitrate", "INTEGER", "INTEGER"),
+    ("video_submissions", "keyframe_interval", "DOUBLE PRECISION", "FLOAT"),
+    ("video_submissions", "media_info", "TEXT", "TEXT"),
+    ("video_submissions", "thumbnail_prefix", "VARCHAR", "VARCHAR"),
+    ("weekly_compilations", "thumbnail_prefix", "VARCHAR", "VARCHAR"),
+    ("weekly_compilations", "progress", "TEXT", "TEXT"),
+]
+
+# create_all only adds indexes together with new tables
+ADDED_INDEXES = [
+    ("ix_video_submissions_group_submitted", "video_submissions", "group_id, submitted_at, id"),
+]
+
 def ensure_db_columns():
     try:
         with engine.connect() as conn:
             dialect = engine.dialect.name
-            if dialect == "postgresql":
-                conn.execute("ALTER TABLE groups ADD COLUMN IF NOT EXISTS deadline_at TIMESTAMPTZ")
-            elif dialect == "sqlite":
-                # SQLite has no IF NOT EXISTS for columns; attempt and ignore errors
-                try:
-                    conn.execute("ALTER TABLE groups ADD COLUMN deadline_at DATETIME")
-                except Exception:
-                    pass
+            for table, column, pg_type, sqlite_type in ADDED_COLUMNS:
+                if dialect == "postgresql":
+                    conn.execute(text(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {column} {pg_type}"))
+                    conn.commit()
+                elif dialect == "sqlite":
+                    # SQLite has no IF NOT EXISTS for columns; attempt and ignore errors
+                    try:
+                        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {sqlite_type}"))
+                        conn.commit()
+                    except Exception:
+                        conn.rollback()
+            # Both dialects support IF NOT EXISTS for indexes
+            for index, table, columns in ADDED_INDEXES:
+                conn.execute(text(f"CREATE INDEX IF NOT EXISTS {index} ON {table} ({columns})"))
+                conn.commit()
     except Exception:
         pass
 
@@ -42,8 +81,13 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],  # Submission list pagination
 )
 
+@app.on_event("startup")
+async def configure_threadpool():
+    to_thread.current_default_thread_limiter().total_tokens = API_THREADPOOL_SIZE
+
 # Security
 security = HTTPBearer()
 
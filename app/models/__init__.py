@@ -1,5 +1,5 @@
 from .user import User
 from .group import Group, GroupMember
-from .video import VideoSubmission, WeeklyCompilation, MusicTrack
+from .video import VideoSubmission, WeeklyCompilation, CompilationJob, MusicTrack
 from .prompt import Prompt
 from app.database import Base
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Float, Boolean
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Float, Boolean, Text, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.database import Base
@@ -12,8 +12,26 @@ class VideoSubmission(Base):
     prompt_id = Column(Integer, ForeignKey("prompts.id"), nullable=False)
     s3_key = Column(String, nullable=False)  # S3 object key for the video
     duration = Column(Float, nullable=False)  # Duration in seconds
+    normalized_s3_key = Column(String, nullable=True)  # Copy in the compilation profile (set after upload)
+    # Media metadata probed at ingest; duration above is replaced by the probed value
+    media_status = Column(String, default="pending")  # pending, ok, invalid
+    video_codec = Column(String, nullable=True)
+    width = Column(Integer, nullable=True)
+    height = Column(Integer, nullable=True)
+    frame_rate = Column(String, nullable=True)  # ffprobe rational, e.g. "30/1"
+    rotation = Column(Integer, nullable=True)
+    has_audio = Column(Boolean, nullable=True)
+    bitrate = Column(Integer, nullable=True)  # bits/s
+    keyframe_interval = Column(Float, nullable=True)  # Average seconds between keyframes
+    media_info = Column(Text, nullable=True)  # JSON: full probe of the upload ("source") and its normalized copy ("normalized")
+    thumbnail_prefix = Column(String, nullable=True)  # S3 prefix holding poster.jpg, sprite.jpg and sprite.vtt
     submitted_at = Column(DateTime(timezone=True), server_default=func.now())
 
+    # Serves a group's submissions newest first, and the keyset cursor that pages through them
+    __table_args__ = (
+        Index("ix_video_submissions_group_submitted", "group_id", "submitted_at", "id"),
+    )
+
     # Relationships
     user = relationship("User", back_populates="video_submissions")
     group = relationship("Group", back_populates="video_submissions")
@@ -29,12 +47,35 @@ class WeeklyCompilation(Base):
     s3_key = Column(String, nullable=True)  # S3 object key for the final video (nullable until completed)
     music_track_id = Column(Integer, ForeignKey("music_tracks.id"), nullable=True)
     status = Column(String, default="pending")  # pending, processing, completed, failed
+    fingerprint = Column(String, nullable=True)  # Hash of the inputs that produced this compilation
+    thumbnail_prefix = Column(String, nullable=True)  # S3 prefix holding poster.jpg, sprite.jpg and sprite.vtt
+    progress = Column(Text, nullable=True)  # JSON: latest progress snapshot written by the compile engine
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     completed_at = Column(DateTime, nullable=True)
 
     # Relationships
     group = relationship("Group", back_populates="weekly_compilations")
     music_track = relationship("MusicTrack", back_populates="compilations")
+    jobs = relationship("CompilationJob", back_populates="compilation", cascade="all, delete-orphan")
+
+class CompilationJob(Base):
+    __tablename__ = "compilation_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    compilation_id = Column(Integer, ForeignKey("weekly_compilations.id", ondelete="CASCADE"), nullable=False, index=True)
+    payload = Column(Text, nullable=False)  # JSON event handed to the compile engine
+    status = Column(String, default="queued", index=True)  # queued, running, succeeded, dead
+    attempts = Column(Integer, default=0)
+    max_attempts = Column(Integer, default=5)
+    run_after = Column(DateTime(timezone=True), server_default=func.now())  # Not claimable before this (retry backoff)
+    worker_id = Column(String, nullable=True)  # Worker holding the lease
+    lease_expires_at = Column(DateTime(timezone=True), nullable=True)  # Reclaimable by other workers after this
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+    # Relationships
+    compilation = relationship("WeeklyCompilation", back_populates="jobs")
 
 class MusicTrack(Base):
     __tablename__ = "music_tracks"
@@ -0,0 +1,73 @@
+"""
+HLS playback for compilations
+
+Players fetch playlists and segments without our Authorization header, so the
+playlist endpoints take a short-lived playback token in the query string
+instead. Playlists are read from S3 and rewritten on the way out: the master
+keeps only the rungs the client can use, and variant playlists point every
+segment at a presigned S3 URL.
+"""
+
+import os
+import re
+from datetime import datetime, timedelta
+from typing import Optional
+
+from jose import JWTError, jwt
+
+from app.auth import SECRET_KEY, ALGORITHM
+
+PLAYBACK_TOKEN_EXPIRE_MINUTES = int(os.getenv("PLAYBACK_TOKEN_EXPIRE_MINUTES", "120"))
+HLS_CONTENT_TYPE = "application/vnd.apple.mpegurl"
+
+RESOLUTION_RE = re.compile(r"RESOLUTION=(\d+)x(\d+)")
+
+def create_playback_token(compilation_id: int, max_height: Optional[int] = None) -> str:
+    expire = datetime.utcnow() + timedelta(minutes=PLAYBACK_TOKEN_EXPIRE_MINUTES)
+    return jwt.encode(
+        {"scope": "playback", "cid": compilation_id, "max_height": max_height, "exp": expire},
+        SECRET_KEY,
+        algorithm=ALGORITHM
+    )
+
+def verify_playback_token(token: str, compilation_id: int) -> Optional[dict]:
+    """The token's claims if it is valid for this compilation, otherwise None"""
+    try:
+        claims = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return None
+    if claims.get("scope") != "playback" or claims.get("cid") != compilation_id:
+        return None
+    return claims
+
+def rewrite_master_playlist(playlist: str, token: str, max_height: Optional[int] = None) -> str:
+    """Drop rungs taller than max_height and carry the token to the variant playlists"""
+    lines = playlist.splitlines()
+    rungs = []
+    i = 0
+    while i < len(lines):
+        if lines[i].startswith("#EXT-X-STREAM-INF") and i + 1 < len(lines):
+            match = RESOLUTION_RE.search(lines[i])
+            rungs.append((int(match.group(2)) if match else 0, lines[i], lines[i + 1].strip()))
+            i += 2
+        else:
+            i += 1
+
+    allowed = [rung for rung in rungs if not max_height or rung[0] <= max_height]
+    if not allowed and rungs:
+        # Never return an empty ladder; the lowest rung is the floor
+        allowed = [min(rungs)]
+
+    out = [line for line in lines if line.startswith("#EXTM3U") or line.startswith("#EXT-X-VERSION") or line.startswith("#EXT-X-INDEPENDENT-SEGMENTS")]
+    for _, info, uri in allowed:
+        out.extend([info, f"{uri}?token={token}"])
+    return "\n".join(out) + "\n"
+
+def rewrite_variant_playlist(playlist: str, presign) -> str:
+    """Replace each relative segment URI with presign(segment_name)"""
+    out = []
+    for line in playlist.splitlines():
+        if line and not line.startswith("#"):
+            line = presign(line.strip())
+        out.append(line)
+    return "\n".join(out) + "\n"
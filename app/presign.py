@@ -0,0 +1,68 @@
+"""
+Presigned URL cache
+
+generate_presigned_url signs with the current time, so every request used to
+hand out a different URL for the same object and no client or HTTP cache could
+reuse a download. URLs are now signed once per object and expiry window and
+kept in a bounded LRU. Within a window every request gets the byte-identical
+URL; its expiry is aligned to the end of the window plus the minimum validity,
+so a URL handed out late in a window is still good for at least that long.
+
+The cache is per process; with several API workers each signs its own URL.
+"""
+
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+
+PRESIGN_WINDOW_SECONDS = int(os.getenv("PRESIGN_WINDOW_SECONDS", "3600"))
+PRESIGN_MIN_VALIDITY_SECONDS = int(os.getenv("PRESIGN_MIN_VALIDITY_SECONDS", "3600"))
+PRESIGN_CACHE_SIZE = int(os.getenv("PRESIGN_CACHE_SIZE", "10000"))
+
+class PresignedUrlCache:
+    """Presigned GET URLs memoized per (key, validity, window) in a thread-safe LRU"""
+
+    def __init__(self, s3_client, bucket: str, window_seconds: int = PRESIGN_WINDOW_SECONDS,
+                 min_validity_seconds: int = PRESIGN_MIN_VALIDITY_SECONDS, max_entries: int = PRESIGN_CACHE_SIZE):
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.window_seconds = window_seconds
+        self.min_validity_seconds = min_validity_seconds
+        self.max_entries = max_entries
+        self._urls = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def url(self, key: str, min_validity_seconds: int = None) -> str:
+        """A GET URL for key that stays valid for at least min_validity_seconds"""
+        validity = min_validity_seconds or self.min_validity_seconds
+        now = time.time()
+        window = int(now // self.window_seconds)
+        cache_key = (key, validity, window)
+
+        with self._lock:
+            url = self._urls.get(cache_key)
+            if url is not None:
+                self._urls.move_to_end(cache_key)
+                self.hits += 1
+                return url
+
+        # Signing is local (no network call), so it is done outside the lock
+        expires_at = (window + 1) * self.window_seconds + validity
+        url = self.s3_client.generate_presigned_url(
+            'get_object',
+            Params={'Bucket': self.bucket, 'Key': key},
+            ExpiresIn=math.ceil(expires_at - now)
+        )
+
+        with self._lock:
+            # Another thread may have signed the same key meanwhile; keep the first URL
+            url = self._urls.setdefault(cache_key, url)
+            self._urls.move_to_end(cache_key)
+            self.misses += 1
+            while len(self._urls) > self.max_entries:
+                self._urls.popitem(last=False)
+        return url
@@ -15,7 +15,7 @@ from app.auth import (
 router = APIRouter()
 
 @router.post("/register", response_model=AuthResponse)
-async def register_user(user: UserCreate, db: Session = Depends(get_db)):
+def register_user(user: UserCreate, db: Session = Depends(get_db)):
     # Check if user already exists
     db_user = db.query(User).filter(User.email == user.email).first()
     if db_user:
@@ -56,7 +56,7 @@ async def register_user(user: UserCreate, db: Session = Depends(get_db)):
     }
 
 @router.post("/login", response_model=AuthResponse)
-async def login_user(user_credentials: UserLogin, db: Session = Depends(get_db)):
+def login_user(user_credentials: UserLogin, db: Session = Depends(get_db)):
     user = authenticate_user(db, user_credentials.email, user_credentials.password)
     if not user:
         raise HTTPException(
@@ -77,11 +77,11 @@ async def login_user(user_credentials: UserLogin, db: Session = Depends(get_db))
     }
 
 @router.get("/me", response_model=UserResponse)
-async def read_users_me(current_user: User = Depends(get_current_user)):
+def read_users_me(current_user: User = Depends(get_current_user)):
     return current_user
 
 @router.post("/logout")
-async def logout_user(current_user: User = Depends(get_current_user)):
+def logout_user(current_user: User = Depends(get_current_user)):
     """
     Logout user - in JWT-based auth, logout is handled client-side
     by removing the token. This endpoint exists for consistency.
@@ -89,7 +89,7 @@ async def logout_user(current_user: User = Depends(get_current_user)):
     return {"message": "Logged out successfully"}
 
 @router.delete("/account")
-async def delete_account(
+def delete_account(
     request: DeleteAccountRequest,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -36,7 +36,7 @@ def generate_invite_code(length: int = 8) -> str:
     return ''.join(secrets.choice(string.ascii_uppercase + string.digits) for _ in range(length))
 
 @router.post("/create", response_model=GroupCreateResponse)
-async def create_group(
+def create_group(
     group: GroupCreate, 
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -129,7 +129,7 @@ async def create_group(
     )
 
 @router.post("/join", response_model=GroupResponse)
-async def join_group(
+def join_group(
     group_join: GroupJoin,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -177,75 +177,44 @@ async def join_group(
     
     return group
 
-@router.get("/my-groups", response_model=List[GroupWithMembers])
-async def get_my_groups(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
-):
-    from sqlalchemy.orm import joinedload
-    
-    # Get groups where user is a member
-    groups = db.query(Group).join(GroupMember).filter(
-        GroupMember.user_id == current_user.id
-    ).all()
-    
-    result = []
-    for group in groups:
-        # Get members with user data
-        members = db.query(GroupMember).join(User).filter(
-            GroupMember.group_id == group.id
-        ).options(joinedload(GroupMember.user)).all()
-        
-        pending_requests = db.query(GroupPendingRequest).filter(
-            GroupPendingRequest.group_id == group.id,
-            GroupPendingRequest.status == "pending"
-        ).all()
-        
-        # Get current active prompt for this group
-        current_prompt = db.query(Prompt).filter(
-            Prompt.group_id == group.id,
-            Prompt.is_active == True
-        ).first()
-        
-        print(f"DEBUG: Group {group.id} ({group.name}) - Found prompt: {current_prompt}")
-        
-        # Serialize current prompt if it exists
-        current_prompt_data = None
-        if current_prompt:
-            current_prompt_data = {
-                "id": current_prompt.id,
-                "text": current_prompt.text,
-                "week_start": current_prompt.week_start.isoformat() if current_prompt.week_start else None,
-                "week_end": current_prompt.week_end.isoformat() if current_prompt.week_end else None,
-                "is_active": current_prompt.is_active
-            }
-            print(f"DEBUG: Group {group.id} - Serialized prompt: {current_prompt_data}")
-        else:
-            print(f"DEBUG: Group {group.id} - No active prompt found")
-        
-        group_data = GroupWithMembers(
-            id=group.id,
-            name=group.name,
-            description=group.description,
-            deadline_at=group.deadline_at,
-            invite_code=group.invite_code,
-            created_by=group.created_by,
-            is_active=group.is_active,
-            created_at=group.created_at,
-            members=[GroupMemberWithUserResponse(
+def load_groups_with_members(db: Session, groups: List[Group]) -> List[GroupWithMembers]:
+    """
+    Members, pending requests and the active prompt for every group, fetched
+    with one IN-query each and assembled in memory, so the number of queries
+    doesn't grow with the number of groups
+    """
+    group_ids = [group.id for group in groups]
+    members_by_group = {group_id: [] for group_id in group_ids}
+    pending_by_group = {group_id: [] for group_id in group_ids}
+    prompt_by_group = {}
+    
+    if group_ids:
+        members = db.query(GroupMember, User).join(
+            User, User.id == GroupMember.user_id
+        ).filter(
+            GroupMember.group_id.in_(group_ids)
+        ).order_by(GroupMember.id).all()
+        for member, user in members:
+            members_by_group[member.group_id].append(GroupMemberWithUserResponse(
                 id=member.id,
                 user_id=member.user_id,
                 group_id=member.group_id,
                 role=member.role,
                 joined_at=member.joined_at,
                 user={
-                    "id": member.user.id,
-                    "username": member.user.username,
-                    "email": member.user.email,
-                    "created_at": member.user.created_at.isoformat() if member.user.created_at else None
+                    "id": user.id,
+                    "username": user.username,
+                    "email": user.email,
+                    "created_at": user.created_at.isoformat() if user.created_at else None
                 }
-            ) for member in members],
-            pending_requests=[GroupPendingRequestResponse(
+            ))
+        
+        pending_requests = db.query(GroupPendingRequest).filter(
+            GroupPendingRequest.group_id.in_(group_ids),
+            GroupPendingRequest.status == "pending"
+        ).order_by(GroupPendingRequest.id).all()
+        for pr in pending_requests:
+            pending_by_group[pr.group_id].append(GroupPendingRequestResponse(
                 id=pr.id,
                 group_id=pr.group_id,
                 invited_username=pr.invited_username,
@@ -253,17 +222,53 @@ async def get_my_groups(
                 status=pr.status,
                 created_at=pr.created_at,
                 expires_at=pr.expires_at
-            ) for pr in pending_requests],
-            current_prompt=current_prompt_data
-        )
+            ))
         
-        print(f"DEBUG: Group {group.id} - Final group_data.current_prompt: {group_data.current_prompt}")
-        result.append(group_data)
+        # Should there be more than one active prompt, the oldest wins
+        prompts = db.query(Prompt).filter(
+            Prompt.group_id.in_(group_ids),
+            Prompt.is_active == True
+        ).order_by(Prompt.id).all()
+        for prompt in prompts:
+            prompt_by_group.setdefault(prompt.group_id, {
+                "id": prompt.id,
+                "text": prompt.text,
+                "week_start": prompt.week_start.isoformat() if prompt.week_start else None,
+                "week_end": prompt.week_end.isoformat() if prompt.week_end else None,
+                "is_active": prompt.is_active
+            })
     
-    return result
+    return [
+        GroupWithMembers(
+            id=group.id,
+            name=group.name,
+            description=group.description,
+            deadline_at=group.deadline_at,
+            invite_code=group.invite_code,
+            created_by=group.created_by,
+            is_active=group.is_active,
+            created_at=group.created_at,
+            members=members_by_group[group.id],
+            pending_requests=pending_by_group[group.id],
+            current_prompt=prompt_by_group.get(group.id)
+        )
+        for group in groups
+    ]
+
+@router.get("/my-groups", response_model=List[GroupWithMembers])
+def get_my_groups(
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    # Get groups where user is a member
+    groups = db.query(Group).join(GroupMember).filter(
+        GroupMember.user_id == current_user.id
+    ).all()
+    
+    return load_groups_with_members(db, groups)
 
 @router.get("/pending-invites", response_model=List[GroupInviteWithDetails])
-async def get_pending_invites(
+def get_pending_invites(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -309,7 +314,7 @@ async def get_pending_invites(
     return result
 
 @router.get("/users", response_model=List[dict])
-async def get_users_for_invite(
+def get_users_for_invite(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -328,7 +333,7 @@ async def get_users_for_invite(
     ]
 
 @router.get("/{group_id}", response_model=GroupWithMembers)
-async def get_group(
+def get_group(
     group_id: int,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -397,7 +402,7 @@ async def get_group(
     )
 
 @router.get("/{group_id}/video-stats")
-async def get_group_video_stats(
+def get_group_video_stats(
     group_id: int,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -439,7 +444,7 @@ async def get_group_video_stats(
     }
 
 @router.post("/{group_id}/invite", response_model=GroupInviteResponse)
-async def invite_users_to_group(
+def invite_users_to_group(
     group_id: int,
     invite_data: GroupInvite,
     current_user: User = Depends(get_current_user),
@@ -541,7 +546,7 @@ async def invite_users_to_group(
     )
 
 @router.post("/invites/{invite_id}/accept", response_model=GroupResponse)
-async def accept_invite(
+def accept_invite(
     invite_id: int,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -616,7 +621,7 @@ async def accept_invite(
         )
 
 @router.post("/invites/{invite_id}/decline")
-async def decline_invite(
+def decline_invite(
     invite_id: int,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -653,7 +658,7 @@ async def decline_invite(
             detail=f"Failed to decline invitation: {str(e)}"
         )
 @router.put("/{group_id}/settings", response_model=GroupUpdateResponse)
-async def update_group_settings(
+def update_group_settings(
     group_id: int,
     updates: GroupUpdate,
     current_user: User = Depends(get_current_user),
@@ -704,7 +709,7 @@ async def update_group_settings(
     )
 
 @router.put("/{group_id}/prompt", response_model=PromptUpdateResponse)
-async def update_group_prompt(
+def update_group_prompt(
     group_id: int,
     prompt_update: PromptUpdate,
     current_user: User = Depends(get_current_user),
@@ -12,7 +12,7 @@ from app.auth import get_current_user
 router = APIRouter()
 
 @router.get("/current", response_model=PromptResponse)
-async def get_current_prompt(
+def get_current_prompt(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -33,7 +33,7 @@ async def get_current_prompt(
     return prompt
 
 @router.get("/all", response_model=List[PromptResponse])
-async def get_all_prompts(
+def get_all_prompts(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -1,11 +1,15 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Request, Response
+from sqlalchemy import func, tuple_
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional, Tuple
 import boto3
+from botocore.exceptions import ClientError
+from concurrent.futures import ThreadPoolExecutor
 import os
 import uuid
 from datetime import datetime, timedelta
-import asyncio
+import base64
+import hashlib
 import json
 
 from app.database import get_db
@@ -13,8 +17,26 @@ from app.models.user import User
 from app.models.group import Group, GroupMember
 from app.models.video import VideoSubmission, WeeklyCompilation, MusicTrack
 from app.models.prompt import Prompt
-from app.schemas.video import VideoSubmissionResponse, WeeklyCompilationResponse, MusicTrackResponse
+from app.schemas.video import (
+    VideoSubmissionResponse, WeeklyCompilationResponse, MusicTrackResponse, ThumbnailBatchRequest, ThumbnailUrls,
+    UploadInitiateRequest, UploadInitiateResponse, UploadCompleteRequest, UploadAbortRequest
+)
 from app.auth import get_current_user
+from app.ingest import enqueue_normalization
+from app.job_queue import enqueue_compilation_job
+from app.presign import PresignedUrlCache
+from app.uploads import (
+    plan_upload_parts, create_upload_token, verify_upload_token, is_video_content_type,
+    UPLOAD_URL_EXPIRE_SECONDS, UPLOAD_MAX_MB
+)
+from app.playback import (
+    create_playback_token, verify_playback_token, rewrite_master_playlist, rewrite_variant_playlist,
+    HLS_CONTENT_TYPE, PLAYBACK_TOKEN_EXPIRE_MINUTES
+)
+from lambda_function import (
+    TARGET_PROFILE, ENCODER_SETTINGS, OUTRO_TEXT, intro_text_for,
+    HLS_LADDER, HLS_MASTER_PLAYLIST, HLS_VARIANT_PLAYLIST, hls_prefix_for
+)
 
 router = APIRouter()
 
@@ -28,47 +50,26 @@ s3_client = boto3.client(
     's3',
     aws_access_key_id=AWS_ACCESS_KEY_ID,
     aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
-    region_name=AWS_REGION
+    region_name=AWS_REGION,
+    endpoint_url=os.getenv("S3_ENDPOINT_URL")
 )
 
-# Lambda client for video processing
-lambda_client = boto3.client(
-    'lambda',
-    aws_access_key_id=AWS_ACCESS_KEY_ID,
-    aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
-    region_name=AWS_REGION
-)
+# Download URLs are reused within an expiry window so clients can cache the videos
+presigned_urls = PresignedUrlCache(s3_client, AWS_BUCKET_NAME)
 
-@router.post("/upload", response_model=VideoSubmissionResponse)
-async def upload_video(
-    group_id: int,
-    prompt_id: int,
-    duration: float,
-    file: UploadFile = File(...),
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
-):
-    # Add logging for debugging
-    print(f"Video upload request: group_id={group_id}, prompt_id={prompt_id}, duration={duration}, user_id={current_user.id}")
-    print(f"File info: filename={file.filename}, content_type={file.content_type}, size={file.size}")
-    
-    # Validate duration
-    if duration <= 0:
-        raise HTTPException(
-            status_code=400,
-            detail="Duration must be greater than 0"
-        )
-    
-    # Validate file
-    if not file.filename:
-        raise HTTPException(
-            status_code=400,
-            detail="No file provided"
-        )
-    
+# Compilation status polling: clients wait about a quarter of the remaining ETA, within these bounds
+STATUS_POLL_MIN_SECONDS = 2
+STATUS_POLL_MAX_SECONDS = 60
+STATUS_POLL_DEFAULT_SECONDS = 10
+
+SUBMISSIONS_PAGE_SIZE = 50
+SUBMISSIONS_MAX_PAGE_SIZE = 200
+
+def check_can_submit(db: Session, user: User, group_id: int, prompt_id: int):
+    """Raise unless user may submit a video to group_id for prompt_id"""
     # Check if user is a member of the group
     membership = db.query(GroupMember).filter(
-        GroupMember.user_id == current_user.id,
+        GroupMember.user_id == user.id,
         GroupMember.group_id == group_id
     ).first()
     
@@ -92,21 +93,52 @@ async def upload_video(
     
     # Check if user has already submitted for this prompt
     existing_submission = db.query(VideoSubmission).filter(
-        VideoSubmission.user_id == current_user.id,
+        VideoSubmission.user_id == user.id,
         VideoSubmission.group_id == group_id,
         VideoSubmission.prompt_id == prompt_id
     ).first()
     
     if existing_submission:
-        print(f"Duplicate submission detected: user_id={current_user.id}, group_id={group_id}, prompt_id={prompt_id}")
+        print(f"Duplicate submission detected: user_id={user.id}, group_id={group_id}, prompt_id={prompt_id}")
         raise HTTPException(
             status_code=400,
             detail="You have already submitted a video for this prompt"
         )
+
+def submission_key_for(group_id: int, user_id: int, filename: Optional[str]) -> str:
+    """A new unique S3 key for an uploaded video"""
+    file_extension = filename.split('.')[-1] if filename and '.' in filename else 'mp4'
+    return f"videos/{group_id}/{user_id}/{uuid.uuid4()}.{file_extension}"
+
+@router.post("/upload", response_model=VideoSubmissionResponse)
+def upload_video(
+    group_id: int,
+    prompt_id: int,
+    duration: float,
+    file: UploadFile = File(...),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    # Add logging for debugging
+    print(f"Video upload request: group_id={group_id}, prompt_id={prompt_id}, duration={duration}, user_id={current_user.id}")
+    print(f"File info: filename={file.filename}, content_type={file.content_type}, size={file.size}")
+    
+    # Validate duration
+    if duration <= 0:
+        raise HTTPException(
+            status_code=400,
+            detail="Duration must be greater than 0"
+        )
     
-    # Generate unique S3 key
-    file_extension = file.filename.split('.')[-1] if '.' in file.filename else 'mp4'
-    s3_key = f"videos/{group_id}/{current_user.id}/{uuid.uuid4()}.{file_extension}"
+    # Validate file
+    if not file.filename:
+        raise HTTPException(
+            status_code=400,
+            detail="No file provided"
+        )
+    
+    check_can_submit(db, current_user, group_id, prompt_id)
+    s3_key = submission_key_for(group_id, current_user.id, file.filename)
     
     try:
         # Upload to S3
@@ -129,6 +161,9 @@ async def upload_video(
         db.commit()
         db.refresh(db_submission)
         
+        # Convert to the compilation profile in the background
+        enqueue_normalization(db_submission.id)
+        
         return db_submission
         
     except Exception as e:
@@ -137,12 +172,212 @@ async def upload_video(
             detail=f"Failed to upload video: {str(e)}"
         )
 
+@router.post("/upload/initiate", response_model=UploadInitiateResponse)
+def initiate_upload(
+    request: UploadInitiateRequest,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Start a direct-to-S3 multipart upload and return presigned URLs for its parts"""
+    if request.duration <= 0:
+        raise HTTPException(status_code=400, detail="Duration must be greater than 0")
+    if request.size <= 0:
+        raise HTTPException(status_code=400, detail="Size must be greater than 0")
+    if request.size > UPLOAD_MAX_MB * 1024 * 1024:
+        raise HTTPException(status_code=413, detail=f"Videos are limited to {UPLOAD_MAX_MB} MB")
+    content_type = (request.content_type or "video/mp4").strip().lower()
+    if not is_video_content_type(content_type):
+        raise HTTPException(status_code=400, detail="content_type must be a video/* type")
+
+    check_can_submit(db, current_user, request.group_id, request.prompt_id)
+    s3_key = submission_key_for(request.group_id, current_user.id, request.filename)
+    part_sizes = plan_upload_parts(request.size)
+
+    try:
+        upload = s3_client.create_multipart_upload(
+            Bucket=AWS_BUCKET_NAME,
+            Key=s3_key,
+            ContentType=content_type
+        )
+        parts = [
+            {
+                "part_number": number,
+                "size": size,
+                "url": s3_client.generate_presigned_url(
+                    'upload_part',
+                    Params={'Bucket': AWS_BUCKET_NAME, 'Key': s3_key, 'UploadId': upload['UploadId'], 'PartNumber': number},
+                    ExpiresIn=UPLOAD_URL_EXPIRE_SECONDS
+                )
+            }
+            for number, size in enumerate(part_sizes, start=1)
+        ]
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to start upload: {str(e)}"
+        )
+
+    print(f"📤 Direct upload started: user_id={current_user.id}, group_id={request.group_id}, key={s3_key}, parts={len(parts)}")
+    return {
+        "upload_token": create_upload_token(
+            current_user.id, request.group_id, request.prompt_id, request.duration,
+            s3_key, upload['UploadId'], len(parts), request.size
+        ),
+        "s3_key": s3_key,
+        "parts": parts,
+        "expires_in": UPLOAD_URL_EXPIRE_SECONDS
+    }
+
+def check_uploaded_size(s3_key: str, declared_size: int):
+    """Delete an uploaded object and raise if it is over the cap or not the size that was declared"""
+    size = s3_client.head_object(Bucket=AWS_BUCKET_NAME, Key=s3_key)['ContentLength']
+    if size > UPLOAD_MAX_MB * 1024 * 1024 or size != declared_size:
+        print(f"⚠️ Upload {s3_key} is {size} bytes, declared {declared_size}; deleting it")
+        s3_client.delete_object(Bucket=AWS_BUCKET_NAME, Key=s3_key)
+        if size > UPLOAD_MAX_MB * 1024 * 1024:
+            raise HTTPException(status_code=413, detail=f"Videos are limited to {UPLOAD_MAX_MB} MB")
+        raise HTTPException(status_code=400, detail=f"Uploaded {size} bytes but declared {declared_size}")
+
+def get_upload_claims(token: str, user: User) -> dict:
+    claims = verify_upload_token(token, user.id)
+    if not claims:
+        raise HTTPException(status_code=400, detail="Invalid or expired upload token")
+    return claims
+
+@router.post("/upload/complete", response_model=VideoSubmissionResponse)
+def complete_upload(
+    request: UploadCompleteRequest,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Finish a direct upload once every part is in S3 and record the submission"""
+    claims = get_upload_claims(request.upload_token, current_user)
+    group_id, prompt_id, s3_key = claims["gid"], claims["pid"], claims["key"]
+
+    # A retried completion gets the submission the first call created
+    existing_submission = db.query(VideoSubmission).filter(
+        VideoSubmission.user_id == current_user.id,
+        VideoSubmission.group_id == group_id,
+        VideoSubmission.prompt_id == prompt_id
+    ).first()
+    if existing_submission and existing_submission.s3_key == s3_key:
+        return existing_submission
+
+    part_numbers = sorted(part.part_number for part in request.parts)
+    if part_numbers != list(range(1, claims["parts"] + 1)):
+        raise HTTPException(
+            status_code=400,
+            detail=f"Expected parts 1-{claims['parts']}, got {len(part_numbers)} parts"
+        )
+
+    # Membership, prompt and duplicates may have changed while the parts were uploading
+    try:
+        check_can_submit(db, current_user, group_id, prompt_id)
+    except HTTPException:
+        try:
+            s3_client.abort_multipart_upload(Bucket=AWS_BUCKET_NAME, Key=s3_key, UploadId=claims["upload_id"])
+        except Exception as e:
+            print(f"⚠️ Could not abort upload {s3_key}: {e}")
+        raise
+
+    try:
+        s3_client.complete_multipart_upload(
+            Bucket=AWS_BUCKET_NAME,
+            Key=s3_key,
+            UploadId=claims["upload_id"],
+            MultipartUpload={'Parts': [
+                {'PartNumber': part.part_number, 'ETag': part.etag}
+                for part in sorted(request.parts, key=lambda part: part.part_number)
+            ]}
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Failed to complete upload: {str(e)}"
+        )
+
+    check_uploaded_size(s3_key, claims["size"])
+
+    db_submission = VideoSubmission(
+        user_id=current_user.id,
+        group_id=group_id,
+        prompt_id=prompt_id,
+        s3_key=s3_key,
+        duration=claims["duration"]
+    )
+    db.add(db_submission)
+    db.commit()
+    db.refresh(db_submission)
+
+    # Convert to the compilation profile in the background
+    enqueue_normalization(db_submission.id)
+
+    print(f"✅ Direct upload completed: submission_id={db_submission.id}, key={s3_key}")
+    return db_submission
+
+@router.post("/upload/abort")
+def abort_upload(
+    request: UploadAbortRequest,
+    current_user: User = Depends(get_current_user)
+):
+    """Cancel a direct upload and discard the parts already in S3"""
+    claims = get_upload_claims(request.upload_token, current_user)
+    try:
+        s3_client.abort_multipart_upload(Bucket=AWS_BUCKET_NAME, Key=claims["key"], UploadId=claims["upload_id"])
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to abort upload: {str(e)}"
+        )
+    return {"message": "Upload aborted"}
+
+def encode_submission_cursor(submitted_at: datetime, submission_id: int) -> str:
+    """Opaque cursor for the position after (submitted_at, id)"""
+    raw = json.dumps([submitted_at.isoformat(), submission_id])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def submitted_at_ordering(db: Session):
+    """
+    The submitted_at expression to sort and compare on, and how to bind a
+    datetime against it. SQLite stores CURRENT_TIMESTAMP as text without
+    fractional seconds while datetime parameters bind with them, so raw
+    comparisons there are string comparisons that put a row below its own
+    cursor; both sides are normalized to whole seconds instead.
+    """
+    if db.get_bind().dialect.name == "sqlite":
+        return func.datetime(VideoSubmission.submitted_at), lambda value: value.strftime("%Y-%m-%d %H:%M:%S")
+    return VideoSubmission.submitted_at, lambda value: value
+
+def decode_submission_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        submitted_at, submission_id = json.loads(raw)
+        return datetime.fromisoformat(submitted_at), int(submission_id)
+    except Exception:
+        raise HTTPException(
+            status_code=400,
+            detail="Invalid cursor"
+        )
+
 @router.get("/submissions/{group_id}", response_model=List[VideoSubmissionResponse])
-async def get_group_submissions(
+def get_group_submissions(
     group_id: int,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+    week_start: Optional[datetime] = None,
+    prompt_id: Optional[int] = None,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
+    """
+    A group's submissions, newest first. Passing limit or cursor returns one
+    page at a time (limit defaults to 50): pass the X-Next-Cursor response
+    header back as cursor to get the next page; the header is absent on the
+    last page. Without either the whole list is returned, as older clients
+    expect. week_start limits the results to that Monday-Sunday week,
+    prompt_id to one prompt.
+    """
     # Check if user is a member of the group
     membership = db.query(GroupMember).filter(
         GroupMember.user_id == current_user.id,
@@ -155,34 +390,85 @@ async def get_group_submissions(
             detail="You are not a member of this group"
         )
     
-    submissions = db.query(VideoSubmission).filter(
+    paginate = limit is not None or cursor is not None
+    if limit is None:
+        limit = SUBMISSIONS_PAGE_SIZE
+    if limit < 1 or limit > SUBMISSIONS_MAX_PAGE_SIZE:
+        raise HTTPException(
+            status_code=400,
+            detail=f"limit must be between 1 and {SUBMISSIONS_MAX_PAGE_SIZE}"
+        )
+    
+    # One query for the page and its uploaders, reading only the columns the response needs
+    query = db.query(
+        VideoSubmission.id,
+        VideoSubmission.user_id,
+        VideoSubmission.group_id,
+        VideoSubmission.prompt_id,
+        VideoSubmission.s3_key,
+        VideoSubmission.duration,
+        VideoSubmission.normalized_s3_key,
+        VideoSubmission.media_status,
+        VideoSubmission.video_codec,
+        VideoSubmission.width,
+        VideoSubmission.height,
+        VideoSubmission.frame_rate,
+        VideoSubmission.rotation,
+        VideoSubmission.has_audio,
+        VideoSubmission.bitrate,
+        VideoSubmission.keyframe_interval,
+        VideoSubmission.submitted_at,
+        User.username,
+        User.email
+    ).outerjoin(
+        User, User.id == VideoSubmission.user_id
+    ).filter(
         VideoSubmission.group_id == group_id
-    ).all()
+    )
+    
+    submitted_at, bind_submitted_at = submitted_at_ordering(db)
+    if week_start:
+        week_start = (week_start - timedelta(days=week_start.weekday())).replace(hour=0, minute=0, second=0, microsecond=0)
+        query = query.filter(
+            submitted_at >= bind_submitted_at(week_start),
+            submitted_at < bind_submitted_at(week_start + timedelta(days=7))
+        )
+    if prompt_id is not None:
+        query = query.filter(VideoSubmission.prompt_id == prompt_id)
+    if cursor:
+        # Keyset: rows strictly after the cursor in (submitted_at, id) order, read straight off the index
+        cursor_submitted_at, cursor_id = decode_submission_cursor(cursor)
+        query = query.filter(
+            tuple_(submitted_at, VideoSubmission.id) < tuple_(bind_submitted_at(cursor_submitted_at), cursor_id)
+        )
+    
+    query = query.order_by(submitted_at.desc(), VideoSubmission.id.desc())
+    if not paginate:
+        rows = query.all()
+    else:
+        # One extra row tells whether there is another page
+        rows = query.limit(limit + 1).all()
+    
+    if paginate and len(rows) > limit:
+        rows = rows[:limit]
+        response.headers["X-Next-Cursor"] = encode_submission_cursor(rows[-1].submitted_at, rows[-1].id)
     
-    # Add user information to each submission
     result = []
-    for submission in submissions:
-        user = db.query(User).filter(User.id == submission.user_id).first()
-        submission_dict = {
-            "id": submission.id,
-            "user_id": submission.user_id,
-            "group_id": submission.group_id,
-            "prompt_id": submission.prompt_id,
-            "s3_key": submission.s3_key,
-            "duration": submission.duration,
-            "submitted_at": submission.submitted_at,
-            "user": {
-                "id": user.id,
-                "username": user.username,
-                "email": user.email
-            } if user else None
-        }
+    for row in rows:
+        submission_dict = row._asdict()
+        username = submission_dict.pop("username")
+        email = submission_dict.pop("email")
+        submission_dict["user"] = {
+            "id": row.user_id,
+            "username": username,
+            "email": email
+        } if username is not None else None
         result.append(submission_dict)
     
     return result
 
 @router.get("/compilations/{group_id}")
-async def get_group_compilations(
+def get_group_compilations(
     group_id: int,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -224,11 +510,7 @@ async def get_group_compilations(
                 print(f"DEBUG: Generating download URL for compilation {comp.id}")
                 print(f"DEBUG: S3_BUCKET_NAME: {AWS_BUCKET_NAME}")
                 print(f"DEBUG: S3_KEY: {comp.s3_key}")
-                download_url = s3_client.generate_presigned_url(
-                    'get_object',
-                    Params={'Bucket': AWS_BUCKET_NAME, 'Key': comp.s3_key},
-                    ExpiresIn=3600  # 1 hour
-                )
+                download_url = presigned_urls.url(comp.s3_key)
                 print(f"DEBUG: Generated download URL: {download_url}")
                 compilation_data["download_url"] = download_url
             except Exception as e:
@@ -243,15 +525,71 @@ async def get_group_compilations(
     
     return result
 
+THUMBNAIL_BATCH_LIMIT = 100
+
+def thumbnail_urls(item_id: int, prefix: str) -> dict:
+    """Presigned URLs for the poster, sprite and sprite index under a thumbnail prefix"""
+    urls = {"id": item_id}
+    for field, name in (("poster_url", "poster.jpg"), ("sprite_url", "sprite.jpg"), ("vtt_url", "sprite.vtt")):
+        urls[field] = presigned_urls.url(f"{prefix}/{name}")
+    return urls
+
+def check_thumbnail_batch(request: ThumbnailBatchRequest):
+    if len(request.ids) > THUMBNAIL_BATCH_LIMIT:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {THUMBNAIL_BATCH_LIMIT} ids per request"
+        )
+
+@router.post("/submissions/thumbnails", response_model=List[ThumbnailUrls])
+def get_submission_thumbnails(
+    request: ThumbnailBatchRequest,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Poster and sprite URLs for a batch of submissions. Submissions outside the
+    user's groups, or without thumbnails yet, are left out.
+    """
+    check_thumbnail_batch(request)
+    submissions = db.query(VideoSubmission).join(
+        GroupMember, GroupMember.group_id == VideoSubmission.group_id
+    ).filter(
+        VideoSubmission.id.in_(request.ids),
+        VideoSubmission.thumbnail_prefix.isnot(None),
+        GroupMember.user_id == current_user.id
+    ).all()
+    return [thumbnail_urls(submission.id, submission.thumbnail_prefix) for submission in submissions]
+
+@router.post("/compilations/thumbnails", response_model=List[ThumbnailUrls])
+def get_compilation_thumbnails(
+    request: ThumbnailBatchRequest,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Poster and sprite URLs for a batch of compilations. Compilations outside the
+    user's groups, or without thumbnails yet, are left out.
+    """
+    check_thumbnail_batch(request)
+    compilations = db.query(WeeklyCompilation).join(
+        GroupMember, GroupMember.group_id == WeeklyCompilation.group_id
+    ).filter(
+        WeeklyCompilation.id.in_(request.ids),
+        WeeklyCompilation.thumbnail_prefix.isnot(None),
+        GroupMember.user_id == current_user.id
+    ).all()
+    return [thumbnail_urls(compilation.id, compilation.thumbnail_prefix) for compilation in compilations]
+
 @router.get("/music-tracks", response_model=List[MusicTrackResponse])
-async def get_music_tracks(
+def get_music_tracks(
     db: Session = Depends(get_db)
 ):
     tracks = db.query(MusicTrack).filter(MusicTrack.is_active == True).all()
     return tracks
 
 @router.get("/download-url/{submission_id}")
-async def get_download_url(
+def get_download_url(
     submission_id: int,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -280,11 +618,7 @@ async def get_download_url(
     
     try:
         # Generate presigned URL for download
-        download_url = s3_client.generate_presigned_url(
-            'get_object',
-            Params={'Bucket': AWS_BUCKET_NAME, 'Key': submission.s3_key},
-            ExpiresIn=3600  # 1 hour
-        )
+        download_url = presigned_urls.url(submission.s3_key)
         
         return {"download_url": download_url}
         
@@ -295,9 +629,9 @@ async def get_download_url(
         )
 
 @router.post("/generate-compilation/{group_id}")
-async def generate_compilation(
+def generate_compilation(
     group_id: int,
-    background_tasks: BackgroundTasks,
+    music_track_id: Optional[int] = None,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -324,6 +658,18 @@ async def generate_compilation(
             detail="Group not found"
         )
     
+    # The chosen background track has to be in the catalog
+    if music_track_id is not None:
+        track = db.query(MusicTrack).filter(
+            MusicTrack.id == music_track_id,
+            MusicTrack.is_active == True
+        ).first()
+        if not track:
+            raise HTTPException(
+                status_code=404,
+                detail="Music track not found"
+            )
+    
     # Check if there are any video submissions for this group
     submissions = db.query(VideoSubmission).filter(
         VideoSubmission.group_id == group_id
@@ -340,11 +686,19 @@ async def generate_compilation(
     
     # Check if compilation already exists for this week
     today = datetime.now()
-    week_start = today - timedelta(days=today.weekday())
+    week_start = (today - timedelta(days=today.weekday())).replace(hour=0, minute=0, second=0, microsecond=0)
     week_end = week_start + timedelta(days=6)
     
     print(f"DEBUG: Checking for existing compilation for group {group_id}, week {week_start.date()} to {week_end.date()}")
     
+    # Fingerprint the inputs so an unchanged week is never compiled twice
+    week_submissions = db.query(VideoSubmission).filter(
+        VideoSubmission.group_id == group_id,
+        VideoSubmission.submitted_at >= week_start,
+        VideoSubmission.submitted_at < week_end + timedelta(days=1)
+    ).all()
+    fingerprint = compilation_fingerprint(week_submissions, music_track_id, week_start)
+    
     existing_compilation = db.query(WeeklyCompilation).filter(
         WeeklyCompilation.group_id == group_id,
         WeeklyCompilation.week_start == week_start.date()
@@ -353,6 +707,19 @@ async def generate_compilation(
     if existing_compilation:
         print(f"DEBUG: Existing compilation found: {existing_compilation.id}, status: {existing_compilation.status}")
         
+        # Same inputs as the finished (or still running) compilation: hand that one back
+        if existing_compilation.fingerprint == fingerprint and (
+            existing_compilation.status == "processing"
+            or (existing_compilation.status == "completed" and existing_compilation.s3_key)
+        ):
+            print(f"DEBUG: Compilation {existing_compilation.id} is up to date, skipping recompile")
+            return {
+                "message": "Video compilation is up to date",
+                "compilation_id": existing_compilation.id,
+                "status": existing_compilation.status,
+                "cached": True
+            }
+        
         # For testing purposes, allow re-compilation by deleting the existing one
         print(f"DEBUG: Deleting existing compilation {existing_compilation.id} to allow re-compilation")
         db.delete(existing_compilation)
@@ -365,23 +732,29 @@ async def generate_compilation(
             week_start=week_start.date(),
             week_end=week_end.date(),
             status="processing",
-            s3_key=None  # Will be updated when processing completes
+            s3_key=None,  # Will be updated when processing completes
+            music_track_id=music_track_id,
+            fingerprint=fingerprint
         )
         db.add(compilation)
+        db.flush()
+        
+        # Queue the compile in the same transaction; a compile worker picks it up
+        enqueue_compilation_job(db, compilation, {
+            "source": "manual_trigger",
+            "group_id": group_id,
+            "compilation_id": compilation.id,
+            "week_start": week_start.isoformat(),
+            "week_end": week_end.isoformat()
+        })
         db.commit()
         db.refresh(compilation)
         
-        # Trigger Lambda function asynchronously
-        background_tasks.add_task(
-            trigger_lambda_processing,
-            group_id, compilation.id
-        )
-        
         return {
             "message": "Video compilation started",
             "compilation_id": compilation.id,
             "status": "processing",
-            "estimated_completion": "5-10 minutes"
+            "poll_after_seconds": STATUS_POLL_DEFAULT_SECONDS
         }
         
     except Exception as e:
@@ -390,36 +763,55 @@ async def generate_compilation(
             detail=f"Failed to start compilation: {str(e)}"
         )
 
-async def trigger_lambda_processing(group_id: int, compilation_id: int):
+FINGERPRINT_HEAD_WORKERS = 8
+
+def submission_etag(s3_key: str) -> Optional[str]:
+    """The uploaded object's ETag, or None if it is missing"""
+    try:
+        return s3_client.head_object(Bucket=AWS_BUCKET_NAME, Key=s3_key)['ETag']
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+            return None
+        raise
+
+def compilation_fingerprint(submissions: List[VideoSubmission], music_track_id: Optional[int], week_start: datetime) -> str:
     """
-    Trigger Lambda function to process video compilation
+    Hash of everything that determines a compilation's output: the clips
+    (S3 keys and ETags), the music track, the card text and the encoder profile.
+    Only this week's objects are HEADed, so the cost doesn't grow with the
+    group's history.
     """
+    keys = [sub.s3_key for sub in submissions]
     try:
-        # Prepare Lambda payload
-        payload = {
-            "source": "manual_trigger",
-            "group_id": group_id,
-            "compilation_id": compilation_id,
-            "week_start": (datetime.now() - timedelta(days=datetime.now().weekday())).isoformat(),
-            "week_end": (datetime.now() - timedelta(days=datetime.now().weekday()) + timedelta(days=6)).isoformat()
-        }
-        
-        # Invoke Lambda function
-        response = lambda_client.invoke(
-            FunctionName='weave-video-processor',
-            InvocationType='Event',  # Asynchronous invocation
-            Payload=json.dumps(payload)
-        )
-        
-        print(f"Lambda function invoked for group {group_id}, compilation {compilation_id}")
-        
+        with ThreadPoolExecutor(max_workers=max(1, min(FINGERPRINT_HEAD_WORKERS, len(keys)))) as executor:
+            etags = dict(zip(keys, executor.map(submission_etag, keys)))
     except Exception as e:
-        print(f"Error invoking Lambda function: {e}")
-        # Update compilation status to failed
-        # This would require a database session, but for now just log the error
+        print(f"❌ Could not read clip metadata for the fingerprint: {e}")
+        raise HTTPException(
+            status_code=502,
+            detail="Could not read this week's videos from storage, please try again"
+        )
+    
+    spec = {
+        "clips": sorted([key, etags.get(key)] for key in keys),
+        "music_track_id": music_track_id,
+        "cards": [intro_text_for(week_start), OUTRO_TEXT],
+        "profile": TARGET_PROFILE,
+        "settings": ENCODER_SETTINGS
+    }
+    return hashlib.sha256(json.dumps(spec, sort_keys=True).encode()).hexdigest()
+
+def poll_after_seconds(compilation_status: str, progress: Optional[dict]) -> Optional[int]:
+    """How long a client should wait before asking again; None once the compilation is settled"""
+    if compilation_status not in ("pending", "processing"):
+        return None
+    eta = progress.get("eta_seconds") if progress else None
+    if eta is None:
+        return STATUS_POLL_DEFAULT_SECONDS
+    return int(max(STATUS_POLL_MIN_SECONDS, min(STATUS_POLL_MAX_SECONDS, eta / 4)))
 
 @router.get("/compilation-status/{compilation_id}")
-async def get_compilation_status(
+def get_compilation_status(
     compilation_id: int,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -449,12 +841,17 @@ async def get_compilation_status(
             detail="You are not a member of this group"
         )
     
+    # Stage, percent, encoded seconds and ETA, written by the engine while it runs
+    progress = json.loads(compilation.progress) if compilation.progress else None
+    
     response_data = {
         "id": compilation.id,
         "group_id": compilation.group_id,
         "week_start": compilation.week_start,
         "week_end": compilation.week_end,
         "status": compilation.status,
+        "progress": progress,
+        "poll_after_seconds": poll_after_seconds(compilation.status, progress),
         "created_at": compilation.created_at,
         "completed_at": compilation.completed_at
     }
@@ -462,20 +859,152 @@ async def get_compilation_status(
     # If compilation is completed, include download URL
     if compilation.status == "completed" and compilation.s3_key:
         try:
-            download_url = s3_client.generate_presigned_url(
-                'get_object',
-                Params={'Bucket': AWS_BUCKET_NAME, 'Key': compilation.s3_key},
-                ExpiresIn=3600  # 1 hour
-            )
+            # Polling clients get the same URL back until the window rolls over
+            download_url = presigned_urls.url(compilation.s3_key)
             response_data["download_url"] = download_url
         except Exception as e:
             print(f"Error generating download URL: {e}")
     
     return response_data
 
+@router.get("/playback/{compilation_id}")
+def get_compilation_playback(
+    compilation_id: int,
+    request: Request,
+    max_height: Optional[int] = None,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Playback URLs for a completed compilation: the HLS master playlist when the
+    ladder exists, and the MP4 as a fallback. max_height caps the rungs offered
+    (e.g. 540 for small screens).
+    """
+    compilation = db.query(WeeklyCompilation).filter(
+        WeeklyCompilation.id == compilation_id
+    ).first()
+    
+    if not compilation:
+        raise HTTPException(
+            status_code=404,
+            detail="Compilation not found"
+        )
+    
+    # Check if user is a member of the group
+    membership = db.query(GroupMember).filter(
+        GroupMember.user_id == current_user.id,
+        GroupMember.group_id == compilation.group_id
+    ).first()
+    
+    if not membership:
+        raise HTTPException(
+            status_code=403,
+            detail="You are not a member of this group"
+        )
+    
+    if compilation.status != "completed" or not compilation.s3_key:
+        raise HTTPException(
+            status_code=400,
+            detail="Compilation is not ready yet"
+        )
+    
+    mp4_url = presigned_urls.url(compilation.s3_key)
+    
+    hls_url = None
+    try:
+        s3_client.head_object(Bucket=AWS_BUCKET_NAME, Key=f"{hls_prefix_for(compilation.s3_key)}/{HLS_MASTER_PLAYLIST}")
+        token = create_playback_token(compilation.id, max_height)
+        hls_url = f"{request.url_for('get_hls_master_playlist', compilation_id=compilation.id)}?token={token}"
+    except Exception:
+        # Compiled before the ladder existed, or the ladder failed: MP4 only
+        pass
+    
+    return {
+        "compilation_id": compilation.id,
+        "hls_url": hls_url,
+        "mp4_url": mp4_url
+    }
+
+def get_playback_compilation(compilation_id: int, token: str, db: Session) -> Tuple[WeeklyCompilation, dict]:
+    """Resolve a playlist request from its playback token"""
+    claims = verify_playback_token(token, compilation_id)
+    if not claims:
+        raise HTTPException(
+            status_code=401,
+            detail="Invalid or expired playback token"
+        )
+    
+    compilation = db.query(WeeklyCompilation).filter(
+        WeeklyCompilation.id == compilation_id
+    ).first()
+    
+    if not compilation or not compilation.s3_key:
+        raise HTTPException(
+            status_code=404,
+            detail="Compilation not found"
+        )
+    return compilation, claims
+
+def read_playlist(s3_key: str) -> str:
+    try:
+        return s3_client.get_object(Bucket=AWS_BUCKET_NAME, Key=s3_key)['Body'].read().decode()
+    except Exception as e:
+        print(f"Error reading playlist {s3_key}: {e}")
+        raise HTTPException(
+            status_code=404,
+            detail="Playlist not found"
+        )
+
+@router.get("/playback/{compilation_id}/hls/master.m3u8", name="get_hls_master_playlist")
+def get_hls_master_playlist(
+    compilation_id: int,
+    token: str,
+    db: Session = Depends(get_db)
+):
+    """
+    Master playlist limited to the rungs the playback token allows
+    """
+    compilation, claims = get_playback_compilation(compilation_id, token, db)
+    playlist = read_playlist(f"{hls_prefix_for(compilation.s3_key)}/{HLS_MASTER_PLAYLIST}")
+    return Response(
+        content=rewrite_master_playlist(playlist, token, claims.get("max_height")),
+        media_type=HLS_CONTENT_TYPE
+    )
+
+@router.get("/playback/{compilation_id}/hls/{variant}/index.m3u8")
+def get_hls_variant_playlist(
+    compilation_id: int,
+    variant: str,
+    token: str,
+    db: Session = Depends(get_db)
+):
+    """
+    Variant playlist with every segment pointing at a presigned S3 URL
+    """
+    compilation, claims = get_playback_compilation(compilation_id, token, db)
+    
+    rung = next((rung for rung in HLS_LADDER if rung['name'] == variant), None)
+    max_height = claims.get("max_height")
+    if not rung or (max_height and rung['height'] > max_height and rung['height'] != min(r['height'] for r in HLS_LADDER)):
+        raise HTTPException(
+            status_code=404,
+            detail="Variant not found"
+        )
+    
+    prefix = f"{hls_prefix_for(compilation.s3_key)}/{variant}"
+    playlist = read_playlist(f"{prefix}/{HLS_VARIANT_PLAYLIST}")
+    
+    def presign(segment: str) -> str:
+        # Same URLs on every playlist fetch, so players and CDNs can cache the segments
+        return presigned_urls.url(f"{prefix}/{segment}", PLAYBACK_TOKEN_EXPIRE_MINUTES * 60)
+    
+    return Response(
+        content=rewrite_variant_playlist(playlist, presign),
+        media_type=HLS_CONTENT_TYPE
+    )
 
 @router.post("/test-compilation/{group_id}")
-async def test_compilation(
+def test_compilation(
     group_id: int,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -1,6 +1,6 @@
 from pydantic import BaseModel
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 
 class VideoSubmissionBase(BaseModel):
     group_id: int
@@ -14,6 +14,16 @@ class VideoSubmissionResponse(VideoSubmissionBase):
     id: int
     user_id: int
     s3_key: str
+    normalized_s3_key: Optional[str] = None
+    media_status: Optional[str] = None
+    video_codec: Optional[str] = None
+    width: Optional[int] = None
+    height: Optional[int] = None
+    frame_rate: Optional[str] = None
+    rotation: Optional[int] = None
+    has_audio: Optional[bool] = None
+    bitrate: Optional[int] = None
+    keyframe_interval: Optional[float] = None
     submitted_at: datetime
     user: Optional[dict] = None  # Will include user info
 
@@ -44,3 +54,42 @@ class MusicTrackResponse(BaseModel):
 
     class Config:
         from_attributes = True
+
+class ThumbnailBatchRequest(BaseModel):
+    ids: List[int]
+
+class ThumbnailUrls(BaseModel):
+    id: int
+    poster_url: str
+    sprite_url: str
+    vtt_url: str
+
+class UploadInitiateRequest(BaseModel):
+    group_id: int
+    prompt_id: int
+    duration: float
+    size: int
+    filename: Optional[str] = None
+    content_type: Optional[str] = "video/mp4"
+
+class UploadPartUrl(BaseModel):
+    part_number: int
+    size: int
+    url: str
+
+class UploadInitiateResponse(BaseModel):
+    upload_token: str
+    s3_key: str
+    parts: List[UploadPartUrl]
+    expires_in: int
+
+class UploadedPart(BaseModel):
+    part_number: int
+    etag: str
+
+class UploadCompleteRequest(BaseModel):
+    upload_token: str
+    parts: List[UploadedPart]
+
+class UploadAbortRequest(BaseModel):
+    upload_token: str
@@ -18,14 +18,14 @@ def create_eventbridge_rule():
     
     # Rule name and description
     rule_name = 'weave-weekly-video-compilation'
-    rule_description = 'Weekly video compilation for Weave app - runs every Sunday at midnight UTC'
+    rule_description = 'Weekly video compilation for Weave app - runs every Monday at 00:00 UTC, as the week ends'
     
     try:
         # Create the rule
         response = eventbridge_client.put_rule(
             Name=rule_name,
             Description=rule_description,
-            ScheduleExpression='cron(0 0 ? * 7 *)',  # Every Sunday at midnight UTC
+            ScheduleExpression='cron(0 0 ? * MON *)',  # Monday 00:00 UTC, right after Sunday ends (AWS cron: 7 = SAT)
             State='ENABLED'
         )
         
@@ -205,7 +205,7 @@ def main():
         print("\n📋 Next steps:")
         print("1. Test the manual trigger rule")
         print("2. Monitor Lambda function logs")
-        print("3. Verify weekly execution on Sunday")
+        print("3. Verify weekly execution on Monday 00:00 UTC")
         
         # Test the rule
         test_choice = input("\n🧪 Test the rule now? (y/n): ").lower().strip()
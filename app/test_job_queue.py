@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Check that the compilation job queue gives up on a job whose worker keeps
+dying: every lease expires without finish_job ever running, and after
+max_attempts the job must be dead-lettered instead of claimed again. Uses a
+throwaway SQLite database; no server needed.
+"""
+
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+# Point the app at a scratch database before anything imports app.database
+DB_PATH = os.path.join(tempfile.mkdtemp(), "job_queue.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_PATH}"
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database import engine, SessionLocal, Base
+from app.models.user import User
+from app.models.group import Group
+from app.models.video import WeeklyCompilation, CompilationJob
+from app.job_queue import enqueue_compilation_job, claim_job, finish_job, utcnow
+
+def seed_job(db, max_attempts: int) -> int:
+    user = User(email="queue@example.com", username="queue", hashed_password="x")
+    db.add(user)
+    db.flush()
+    group = Group(name="queue group", invite_code="queue", created_by=user.id)
+    db.add(group)
+    db.flush()
+    compilation = WeeklyCompilation(group_id=group.id, week_start=datetime(2026, 10, 12), week_end=datetime(2026, 10, 18), status="processing")
+    db.add(compilation)
+    db.flush()
+    job = enqueue_compilation_job(db, compilation, {"group_id": group.id, "compilation_id": compilation.id})
+    job.max_attempts = max_attempts
+    db.commit()
+    return job.id
+
+def expire_lease(db, job_id: int):
+    """What a crashed worker leaves behind: a running job whose lease has run out"""
+    job = db.query(CompilationJob).filter(CompilationJob.id == job_id).first()
+    job.lease_expires_at = utcnow() - timedelta(seconds=1)
+    db.commit()
+
+def test_crashing_worker_is_dead_lettered():
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        job_id = seed_job(db, max_attempts=3)
+
+        attempts = []
+        while True:
+            job = claim_job(db, f"worker-{len(attempts)}")
+            if not job:
+                break
+            attempts.append(job.attempts)
+            assert len(attempts) <= 3, f"job claimed past max_attempts: {attempts}"
+            expire_lease(db, job_id)
+
+        job = db.query(CompilationJob).filter(CompilationJob.id == job_id).first()
+        print(f"📊 attempts {attempts}, final status {job.status}, compilation {job.compilation.status}")
+        assert attempts == [1, 2, 3], f"expected attempts [1, 2, 3], got {attempts}"
+        assert job.status == "dead", f"job is {job.status}, expected dead"
+        assert job.compilation.status == "failed"
+    finally:
+        db.close()
+
+def test_requeue_clears_completion():
+    db = SessionLocal()
+    try:
+        job_id = seed_job_for_retry(db)
+        job = claim_job(db, "worker-retry")
+        assert job and job.id == job_id
+        job.compilation.completed_at = datetime.utcnow()
+        job.compilation.progress = '{"percent": 40}'
+        db.commit()
+
+        assert finish_job(db, job_id, "worker-retry", error="boom") == "queued"
+        compilation = db.query(CompilationJob).filter(CompilationJob.id == job_id).first().compilation
+        assert compilation.status == "processing"
+        assert compilation.completed_at is None and compilation.progress is None
+    finally:
+        db.close()
+        engine.dispose()
+
+def seed_job_for_retry(db) -> int:
+    group = db.query(Group).first()
+    compilation = WeeklyCompilation(group_id=group.id, week_start=datetime(2026, 10, 19), week_end=datetime(2026, 10, 25), status="processing")
+    db.add(compilation)
+    db.flush()
+    job = enqueue_compilation_job(db, compilation, {"group_id": group.id, "compilation_id": compilation.id})
+    db.commit()
+    return job.id
+
+if __name__ == "__main__":
+    try:
+        test_crashing_worker_is_dead_lettered()
+        test_requeue_clears_completion()
+        print("\n🎉 Job queue dead-letters crashed jobs and requeues cleanly!")
+    except AssertionError as e:
+        print(f"\n💥 {e}")
+        sys.exit(1)
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Check that /groups/my-groups runs the same number of queries whether the
+user is in 1 group or 20. Uses a throwaway SQLite database; no server needed.
+"""
+
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+# Point the app at a scratch database before anything imports app.database
+DB_PATH = os.path.join(tempfile.mkdtemp(), "my_groups_queries.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_PATH}"
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event
+
+from app.database import engine, SessionLocal, Base
+from app.models.user import User
+from app.models.group import Group, GroupMember, GroupPendingRequest
+from app.models.prompt import Prompt
+from app.models import video  # noqa: F401 - registers the tables the relationships point at
+from app.routers.groups import get_my_groups
+
+def seed_user_with_groups(db, name: str, group_count: int) -> User:
+    """A user in group_count groups, each with a friend, a pending invite and an active prompt"""
+    user = User(email=f"{name}@example.com", username=name, hashed_password="x")
+    friend = User(email=f"{name}-friend@example.com", username=f"{name}-friend", hashed_password="x")
+    db.add_all([user, friend])
+    db.flush()
+
+    now = datetime.utcnow()
+    for i in range(group_count):
+        group = Group(name=f"{name} group {i}", invite_code=f"{name}-{i}", created_by=user.id)
+        db.add(group)
+        db.flush()
+        db.add_all([
+            GroupMember(user_id=user.id, group_id=group.id, role="admin"),
+            GroupMember(user_id=friend.id, group_id=group.id),
+            GroupPendingRequest(group_id=group.id, invited_username=f"invitee-{i}", invited_by=user.id),
+            Prompt(text=f"Prompt {i}", group_id=group.id, week_start=now, week_end=now + timedelta(days=7))
+        ])
+    db.commit()
+    return user
+
+def count_queries(db, user: User):
+    """Run get_my_groups and return (number of SQL statements, response)"""
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    db.expire_all()
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        groups = get_my_groups(current_user=user, db=db)
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+    return len(statements), groups
+
+def test_my_groups_query_count():
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        one = seed_user_with_groups(db, "solo", 1)
+        many = seed_user_with_groups(db, "busy", 20)
+
+        one_queries, one_groups = count_queries(db, one)
+        many_queries, many_groups = count_queries(db, many)
+        print(f"📊 1 group: {one_queries} queries, 20 groups: {many_queries} queries")
+
+        assert len(one_groups) == 1 and len(many_groups) == 20
+        for group in many_groups:
+            assert len(group.members) == 2, f"group {group.id} has {len(group.members)} members"
+            assert len(group.pending_requests) == 1
+            assert group.current_prompt is not None
+        assert many_queries == one_queries, f"query count grew with groups: {one_queries} -> {many_queries}"
+    finally:
+        db.close()
+        engine.dispose()
+
+if __name__ == "__main__":
+    try:
+        test_my_groups_query_count()
+        print("\n🎉 /groups/my-groups runs in a constant number of queries!")
+    except AssertionError as e:
+        print(f"\n💥 {e}")
+        sys.exit(1)
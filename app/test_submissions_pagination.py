@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Page through /videos/submissions/{group_id} with its cursor and check every
+submission comes back exactly once, newest first. Uses a throwaway SQLite
+database (the default DATABASE_URL dialect); no server needed.
+"""
+
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+# Point the app at a scratch database before anything imports app.database
+DB_PATH = os.path.join(tempfile.mkdtemp(), "submissions_pagination.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_PATH}"
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import Response
+
+from app.database import engine, SessionLocal, Base
+from app.models.user import User
+from app.models.group import Group, GroupMember
+from app.models.prompt import Prompt
+from app.models.video import VideoSubmission
+from app.routers.videos import get_group_submissions
+
+def seed_group(db):
+    """A group with 5 submissions stamped by the database and 4 older ones sharing one second"""
+    user = User(email="pager@example.com", username="pager", hashed_password="x")
+    db.add(user)
+    db.flush()
+    group = Group(name="pager group", invite_code="pager", created_by=user.id)
+    db.add(group)
+    db.flush()
+    now = datetime.utcnow()
+    prompt = Prompt(text="Prompt", group_id=group.id, week_start=now, week_end=now + timedelta(days=7))
+    db.add_all([GroupMember(user_id=user.id, group_id=group.id, role="admin"), prompt])
+    db.flush()
+
+    older = now - timedelta(days=1)
+    for i in range(4):
+        db.add(VideoSubmission(user_id=user.id, group_id=group.id, prompt_id=prompt.id,
+                               s3_key=f"videos/old-{i}.mp4", duration=1.0, submitted_at=older))
+    db.flush()
+    # These take submitted_at from the CURRENT_TIMESTAMP server default
+    for i in range(5):
+        db.add(VideoSubmission(user_id=user.id, group_id=group.id, prompt_id=prompt.id,
+                               s3_key=f"videos/new-{i}.mp4", duration=1.0))
+        db.flush()
+    db.commit()
+    return user, group
+
+def test_pages_cover_every_submission():
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        user, group = seed_group(db)
+        expected = [
+            row.id for row in db.query(VideoSubmission).filter(VideoSubmission.group_id == group.id)
+            .order_by(VideoSubmission.submitted_at.desc(), VideoSubmission.id.desc())
+        ]
+
+        seen, cursor, pages = [], None, 0
+        while True:
+            response = Response()
+            page = get_group_submissions(group.id, response, cursor=cursor, limit=2, current_user=user, db=db)
+            seen.extend(item["id"] for item in page)
+            pages += 1
+            cursor = response.headers.get("X-Next-Cursor")
+            assert pages <= len(expected), f"cursor never reached the end: {seen}"
+            if not cursor:
+                break
+        print(f"📄 {pages} pages: {seen}")
+        assert seen == expected, f"expected {expected}, got {seen}"
+
+        # No limit or cursor: the whole list in one response, as older clients expect
+        response = Response()
+        everything = get_group_submissions(group.id, response, current_user=user, db=db)
+        assert [item["id"] for item in everything] == expected
+        assert "X-Next-Cursor" not in response.headers
+    finally:
+        db.close()
+        engine.dispose()
+
+if __name__ == "__main__":
+    try:
+        test_pages_cover_every_submission()
+        print("\n🎉 Submission pages cover every submission exactly once!")
+    except AssertionError as e:
+        print(f"\n💥 {e}")
+        sys.exit(1)
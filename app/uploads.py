@@ -0,0 +1,70 @@
+"""
+Direct-to-S3 video uploads
+
+Clients upload straight to S3 with presigned multipart part URLs instead of
+streaming every byte through the API. Initiating an upload runs the same
+checks as /videos/upload, starts the multipart upload and hands back the part
+URLs along with a signed upload token. The token carries everything the
+completion call needs (who, where, which multipart upload), so no pending
+upload state is stored on our side.
+
+Presigned part URLs don't bind a length, so the declared size is only a
+promise: completion checks the assembled object against it and the
+UPLOAD_MAX_MB cap, and deletes it if either is off.
+
+Uploads that are never completed leave parts behind in S3; the bucket should
+have an AbortIncompleteMultipartUpload lifecycle rule to clean them up.
+"""
+
+import math
+import os
+import re
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from jose import JWTError, jwt
+
+from app.auth import SECRET_KEY, ALGORITHM
+
+UPLOAD_URL_EXPIRE_SECONDS = int(os.getenv("UPLOAD_URL_EXPIRE_SECONDS", "3600"))
+UPLOAD_PART_SIZE_MB = int(os.getenv("UPLOAD_PART_SIZE_MB", "8"))
+UPLOAD_MAX_MB = int(os.getenv("UPLOAD_MAX_MB", "2048"))
+
+# The stored Content-Type is served back on presigned downloads, so only plain video types are accepted
+VIDEO_CONTENT_TYPE_RE = re.compile(r"^video/[a-z0-9][a-z0-9.+-]*$")
+
+# S3 limits: every part but the last is at least 5 MiB, and at most 10,000 parts
+S3_MIN_PART_SIZE = 5 * 1024 * 1024
+S3_MAX_PARTS = 10000
+
+def plan_upload_parts(size: int) -> List[int]:
+    """Byte size of each part for an upload of size bytes"""
+    part_size = max(UPLOAD_PART_SIZE_MB * 1024 * 1024, S3_MIN_PART_SIZE, math.ceil(size / S3_MAX_PARTS))
+    count = max(1, math.ceil(size / part_size))
+    return [part_size] * (count - 1) + [size - part_size * (count - 1)]
+
+def is_video_content_type(content_type: str) -> bool:
+    return bool(VIDEO_CONTENT_TYPE_RE.match(content_type))
+
+def create_upload_token(user_id: int, group_id: int, prompt_id: int, duration: float,
+                        s3_key: str, upload_id: str, part_count: int, size: int) -> str:
+    # Valid a little longer than the part URLs so a slow last part can still be completed
+    expire = datetime.utcnow() + timedelta(seconds=UPLOAD_URL_EXPIRE_SECONDS + 300)
+    return jwt.encode(
+        {
+            "scope": "upload", "uid": user_id, "gid": group_id, "pid": prompt_id, "duration": duration,
+            "key": s3_key, "upload_id": upload_id, "parts": part_count, "size": size, "exp": expire
+        },
+        SECRET_KEY,
+        algorithm=ALGORITHM
+    )
+
+def verify_upload_token(token: str, user_id: int) -> Optional[dict]:
+    """The token's claims if it is a valid upload token for this user, otherwise None"""
+    try:
+        claims = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return None
+    if claims.get("scope") != "upload" or claims.get("uid") != user_id:
+        return None
+    return claims
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Benchmark an API endpoint at increasing concurrency
+
+Throughput should keep climbing with concurrency until the threadpool or the
+database pool saturates. If routes block the event loop it stays flat at the
+single-request rate no matter how many clients there are.
+
+Usage: python benchmark_concurrency.py [path] [requests_per_level]
+  BASE_URL, BENCH_EMAIL and BENCH_PASSWORD (or BENCH_TOKEN) come from the environment.
+"""
+import os
+import sys
+import time
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+import requests
+
+# Configuration
+BASE_URL = os.getenv("BASE_URL", "http://localhost:8000")
+BENCH_EMAIL = os.getenv("BENCH_EMAIL", "o@gmail.com")
+BENCH_PASSWORD = os.getenv("BENCH_PASSWORD", "password123")
+CONCURRENCY_LEVELS = [1, 2, 4, 8, 16, 32]
+
+def get_token() -> str:
+    token = os.getenv("BENCH_TOKEN")
+    if token:
+        return token
+    response = requests.post(f"{BASE_URL}/auth/login", json={"email": BENCH_EMAIL, "password": BENCH_PASSWORD})
+    if response.status_code != 200:
+        print(f"❌ Login failed: {response.status_code}")
+        print(response.text)
+        sys.exit(1)
+    return response.json()["access_token"]
+
+def run_level(path: str, headers: dict, concurrency: int, total: int):
+    """Send total requests with concurrency clients; returns (req/s, latencies, errors)"""
+    sessions = [requests.Session() for _ in range(concurrency)]
+
+    def worker(i: int):
+        session = sessions[i % concurrency]
+        latencies, errors = [], 0
+        for _ in range(i, total, concurrency):
+            start = time.perf_counter()
+            response = session.get(f"{BASE_URL}{path}", headers=headers)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code != 200:
+                errors += 1
+        return latencies, errors
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(worker, range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    latencies = sorted(l for result in results for l in result[0])
+    errors = sum(result[1] for result in results)
+    return total / elapsed, latencies, errors
+
+def benchmark(path: str, per_level: int):
+    print(f"🏁 Benchmarking GET {path} on {BASE_URL} ({per_level} requests per level)")
+    headers = {"Authorization": f"Bearer {get_token()}"}
+
+    # Warm up connections and caches so the first level isn't penalized
+    run_level(path, headers, 1, 5)
+
+    print(f"{'clients':>8} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'errors':>7}")
+    for concurrency in CONCURRENCY_LEVELS:
+        rate, latencies, errors = run_level(path, headers, concurrency, per_level)
+        p50 = statistics.median(latencies) * 1000
+        p95 = latencies[int(len(latencies) * 0.95) - 1] * 1000
+        print(f"{concurrency:>8} {rate:>8.1f} {p50:>8.1f} {p95:>8.1f} {errors:>7}")
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else "/groups/my-groups"
+    per_level = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    benchmark(path, per_level)
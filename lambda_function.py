@@ -4,23 +4,225 @@ Processes weekly video submissions and creates compilations
 FIXED: Properly uses date range from payload instead of default date range
 """
 
+import base64
+import hashlib
 import json
 import os
 import boto3
+import shutil
 import subprocess
 import tempfile
+import struct
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime, timedelta
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Tuple
 import psycopg2
+from botocore.config import Config
+from boto3.s3.transfer import TransferConfig
 from psycopg2.extras import RealDictCursor
 
 # AWS Configuration
 S3_BUCKET = os.environ.get('S3_BUCKET', 'weave-video-project')
 AWS_REGION = os.environ.get('AWS_REGION', 'us-east-1')  # Match Lambda region
+S3_ENDPOINT_URL = os.environ.get('S3_ENDPOINT_URL') or None  # Local object store when run outside AWS
 DATABASE_URL = os.environ.get('DATABASE_URL')
 
+# Intermediate profile every compilation input is encoded to. When all inputs
+# already match it the compilation is a stream-copy remux instead of an encode.
+TARGET_PROFILE = {
+    'width': 1280,
+    'height': 720,
+    'fps': '30/1',
+    'video_codec': 'h264',
+    'video_profile': 'High',
+    'level': 31,
+    'pix_fmt': 'yuv420p',
+    'audio_codec': 'aac',
+    'sample_rate': 48000,
+    'channels': 2
+}
+ENCODER_SETTINGS = {'preset': 'fast', 'crf': 23}
+
+# 'segments' re-encodes mismatched clips as parallel per-clip jobs and joins
+# them with a stream copy; 'filter' runs the legacy single filter graph
+COMPILE_STRATEGY = os.environ.get('COMPILE_STRATEGY', 'segments')
+COMPILE_WORKERS = int(os.environ.get('COMPILE_WORKERS') or os.cpu_count() or 1)
+
+# Encode budget planning. Throughput is seconds of 720p30 video one vCPU encodes
+# per wall-clock second with libx264 at each preset. Measure it on the deployed
+# memory size with {"source": "calibrate_encoder"} and paste the result into
+# ENCODE_THROUGHPUT (JSON) to override these defaults.
+ENCODE_THROUGHPUT = {
+    'medium': 1.0,
+    'fast': 1.5,
+    'veryfast': 3.0,
+    'superfast': 4.5
+}
+ENCODE_THROUGHPUT.update(json.loads(os.environ.get('ENCODE_THROUGHPUT') or '{}'))
+# Best quality first. No ultrafast: it drops CABAC and 8x8dct, which downgrades
+# the stream to Constrained Baseline and breaks stream-copy concat with the
+# High profile segments in the cache.
+ENCODE_PRESETS = ['medium', 'fast', 'veryfast', 'superfast']
+DECODE_COST = 0.15  # Decoding one input pixel, relative to encoding one output pixel
+COPY_THROUGHPUT = 40.0  # Seconds of video per second for the stream-copy and preview passes
+BUDGET_SAFETY_SECONDS = 60
+# 'invoke' splits segment encodes that can't fit over extra invocations of this
+# function; 'off' never splits. Defaults to 'invoke' only inside Lambda, so the
+# local and sync executors never call out to the deployed function.
+ENCODE_SPLIT = os.environ.get('ENCODE_SPLIT', 'invoke' if os.environ.get('AWS_LAMBDA_FUNCTION_NAME') else 'off')
+ENCODE_SPLIT_MAX_WORKERS = int(os.environ.get('ENCODE_SPLIT_MAX_WORKERS', '8'))
+SPLIT_INVOKE_OVERHEAD = 15  # seconds: cold start and input setup of a segment worker
+
+# Compile progress is parsed from ffmpeg's -progress output and written to
+# weekly_compilations.progress at most once per PROGRESS_UPDATE_SECONDS
+PROGRESS_UPDATE_SECONDS = float(os.environ.get('PROGRESS_UPDATE_SECONDS', '5'))
+# Rough share of a compile's wall time per stage, for the overall percent
+PROGRESS_STAGE_WEIGHTS = {'preparing': 5, 'encoding': 50, 'stitching': 15, 'thumbnails': 5, 'hls': 25}
+
+# Database connection reuse across warm invocations
+DB_CONNECT_TIMEOUT = int(os.environ.get('DB_CONNECT_TIMEOUT', '5'))  # seconds
+DB_LIVENESS_CHECK_AFTER = float(os.environ.get('DB_LIVENESS_CHECK_AFTER', '30'))  # idle seconds before a SELECT 1
+
+# Weekly scheduler fan-out: 'queue' adds a compilation_jobs row per group for the
+# compile workers (retried with backoff), 'inline' compiles groups in this
+# invocation, 'invoke' hands each group to its own asynchronous invocation
+FANOUT_MODE = os.environ.get('FANOUT_MODE', 'queue')
+FANOUT_CONCURRENCY = int(os.environ.get('FANOUT_CONCURRENCY', '2'))
+JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', '5'))
+
+# Intro/outro cards are cached by content in the warm container's /tmp and in S3
+CARD_CACHE_DIR = os.environ.get('CARD_CACHE_DIR', '/tmp/weave-card-cache')
+CARD_CACHE_PREFIX = 'cache/cards'
+OUTRO_TEXT = "Created with Weave"
+
+# Per-clip encoded segments are kept so a recompile only encodes new or changed clips
+SEGMENT_CACHE_PREFIX = 'cache/segments'
+
+# Background music: tracks are decoded and resampled to the output profile once,
+# then cached like cards. The mix runs in the concat pass (video is still copied).
+MUSIC_CACHE_DIR = os.environ.get('MUSIC_CACHE_DIR', '/tmp/weave-music-cache')
+MUSIC_CACHE_PREFIX = 'cache/music'
+MUSIC_VOLUME = float(os.environ.get('MUSIC_VOLUME', '0.35'))
+MUSIC_FADE_IN = 1.5  # seconds
+MUSIC_FADE_OUT = 3.0  # seconds
+MUSIC_AUDIO_BITRATE = '160k'
+
+# Source clip download tuning
+DOWNLOAD_CONCURRENCY = int(os.environ.get('DOWNLOAD_CONCURRENCY', '8'))  # Clips fetched at once
+DOWNLOAD_PART_CONCURRENCY = int(os.environ.get('DOWNLOAD_PART_CONCURRENCY', '4'))  # Ranged GETs per clip
+DOWNLOAD_BYTE_BUDGET_MB = int(os.environ.get('DOWNLOAD_BYTE_BUDGET_MB', '512'))  # Max bytes in flight across all clips
+DOWNLOAD_MAX_ATTEMPTS = int(os.environ.get('DOWNLOAD_MAX_ATTEMPTS', '3'))
+
+# 'stream' hands ffmpeg presigned URLs so decoding starts while bytes arrive;
+# clips that need seeking (moov atom after mdat) are still downloaded first.
+# 'download' stages every clip on local disk.
+COMPILE_INPUT_MODE = os.environ.get('COMPILE_INPUT_MODE', 'stream')
+INPUT_URL_EXPIRY = 3600  # seconds
+MOOV_PROBE_BYTES = 64 * 1024
+
+# 'stream' pipes fragmented MP4 from ffmpeg into an S3 multipart upload so the
+# upload overlaps the encode; 'file' writes the whole file, then uploads it
+COMPILE_OUTPUT_MODE = os.environ.get('COMPILE_OUTPUT_MODE', 'stream')
+UPLOAD_PART_SIZE_MB = int(os.environ.get('UPLOAD_PART_SIZE_MB', '8'))  # S3 minimum is 5
+UPLOAD_PART_CONCURRENCY = int(os.environ.get('UPLOAD_PART_CONCURRENCY', '4'))
+
+# Scratch space: a compile's working files go to tmpfs when they fit in
+# SCRATCH_MEMORY_MB, to disk when they fit there, and otherwise the compile
+# streams its inputs and output and drops each segment once it is in the
+# segment cache. A compile that can't fit even then fails before downloading.
+SCRATCH_TMPFS_DIR = os.environ.get('SCRATCH_TMPFS_DIR', '/dev/shm')
+SCRATCH_MEMORY_MB = int(os.environ.get('SCRATCH_MEMORY_MB', '512'))
+SCRATCH_DISK_DIR = os.environ.get('SCRATCH_DISK_DIR') or tempfile.gettempdir()
+SCRATCH_RESERVE_MB = int(os.environ.get('SCRATCH_RESERVE_MB', '64'))  # Left free for cards, music, thumbnails
+SCRATCH_VIDEO_MBPS = float(os.environ.get('SCRATCH_VIDEO_MBPS', '5'))  # Assumed bitrate of encoded segments and output
+
+# HLS ladder written next to each compilation MP4 so players can start on a
+# low rung and switch up; segment length is also the keyframe interval
+HLS_ENABLED = os.environ.get('HLS_ENABLED', 'true').lower() == 'true'
+HLS_SEGMENT_SECONDS = int(os.environ.get('HLS_SEGMENT_SECONDS', '4'))
+HLS_LADDER = [
+    {'name': '360p', 'width': 640, 'height': 360, 'video_bitrate': '800k', 'maxrate': '856k', 'bufsize': '1200k', 'audio_bitrate': '96k'},
+    {'name': '540p', 'width': 960, 'height': 540, 'video_bitrate': '2000k', 'maxrate': '2140k', 'bufsize': '3000k', 'audio_bitrate': '128k'},
+    {'name': '720p', 'width': 1280, 'height': 720, 'video_bitrate': '3500k', 'maxrate': '3750k', 'bufsize': '5250k', 'audio_bitrate': '128k'},
+]
+HLS_MASTER_PLAYLIST = 'master.m3u8'
+HLS_VARIANT_PLAYLIST = 'index.m3u8'
+
+# Poster frame and scrubbing sprite (with a WebVTT index) for every video
+THUMBNAIL_INTERVAL = float(os.environ.get('THUMBNAIL_INTERVAL', '2'))  # Seconds between sprite tiles
+THUMBNAIL_MAX_TILES = 100  # Longer videos get a wider interval instead of a bigger sprite
+THUMBNAIL_WIDTH = 160
+THUMBNAIL_HEIGHT = 90
+SPRITE_COLUMNS = 10
+POSTER_WIDTH = 640
+
 # Initialize AWS clients
-s3_client = boto3.client('s3', region_name=AWS_REGION)
+# The connection pool has to cover every ranged GET of every concurrent download
+s3_client = boto3.client(
+    's3',
+    region_name=AWS_REGION,
+    endpoint_url=S3_ENDPOINT_URL,
+    config=Config(max_pool_connections=DOWNLOAD_CONCURRENCY * DOWNLOAD_PART_CONCURRENCY)
+)
+download_transfer_config = TransferConfig(max_concurrency=DOWNLOAD_PART_CONCURRENCY)
+lambda_client = boto3.client('lambda', region_name=AWS_REGION)
+# Segment workers are awaited, so reads must outlast a whole invocation; failures are not retried
+worker_lambda_client = boto3.client('lambda', region_name=AWS_REGION, config=Config(read_timeout=960, retries={'max_attempts': 0}))
+
+class DatabaseConnection:
+    """
+    A single psycopg2 connection kept at module level so warm invocations skip
+    the TCP + TLS + auth handshake. Autocommit keeps every statement to one
+    round trip (no separate BEGIN/COMMIT).
+    """
+    def __init__(self, dsn: str):
+        self.dsn = dsn
+        self.conn = None
+        self.last_used = 0.0
+        # Fan-out threads share the connection one statement at a time
+        self.lock = threading.RLock()
+
+    def _connect(self):
+        print(f"🔗 Connecting to database: {self.dsn.split('@')[1] if '@' in self.dsn else 'local'}")
+        self.conn = psycopg2.connect(self.dsn, connect_timeout=DB_CONNECT_TIMEOUT)
+        self.conn.autocommit = True
+
+    def get(self):
+        if self.conn is None or self.conn.closed:
+            self._connect()
+        elif time.monotonic() - self.last_used > DB_LIVENESS_CHECK_AFTER:
+            # The container may have been frozen long enough for the server to drop us
+            try:
+                with self.conn.cursor() as cursor:
+                    cursor.execute("SELECT 1")
+            except psycopg2.Error:
+                print("🔌 Database connection went stale, reconnecting")
+                try:
+                    self.conn.close()
+                except Exception:
+                    pass
+                self._connect()
+        self.last_used = time.monotonic()
+        return self.conn
+
+    @contextmanager
+    def cursor(self, dict_rows: bool = False):
+        with self.lock:
+            cursor = self.get().cursor(cursor_factory=RealDictCursor if dict_rows else None)
+            try:
+                yield cursor
+            except (psycopg2.OperationalError, psycopg2.InterfaceError):
+                # Broken connection: drop it so the next statement reconnects
+                self.conn.close()
+                raise
+            finally:
+                if not cursor.closed:
+                    cursor.close()
+
+db = DatabaseConnection(DATABASE_URL) if DATABASE_URL else None
 
 def lambda_handler(event, context):
     """
@@ -42,7 +244,7 @@ def lambda_handler(event, context):
             print(f"⚠️ FFmpeg test failed: {e}")
         
         # Determine FFmpeg path
-        ffmpeg_path = '/opt/bin/ffmpeg' if os.path.exists('/opt/bin/ffmpeg') else 'ffmpeg'
+        ffmpeg_path = os.environ.get('FFMPEG_PATH') or ('/opt/bin/ffmpeg' if os.path.exists('/opt/bin/ffmpeg') else 'ffmpeg')
         print(f"Using FFmpeg at: {ffmpeg_path}")
         
         # Parse event - FIXED: Use date range from payload
@@ -54,6 +256,47 @@ def lambda_handler(event, context):
         
         print(f"📅 Received date range: {week_start_str} to {week_end_str}")
         
+        # Segment worker: encode a share of a split compile into the segment cache
+        if source == 'segment_worker':
+            stats = encode_segment_chunk(event['videos'], event['settings'], ffmpeg_path)
+            return {
+                'statusCode': 200,
+                'body': json.dumps({'message': 'Segments encoded', 'result': stats})
+            }
+        
+        if source == 'calibrate_encoder':
+            return {
+                'statusCode': 200,
+                'body': json.dumps({'message': 'Encoder calibrated', 'throughput': calibrate_encoder(ffmpeg_path)})
+            }
+        
+        # The weekly rollover renders next week's cards so no compile pays for them
+        cards = None
+        if source in ('weekly_scheduler', 'card_prerender'):
+            cards = prerender_week_cards(ffmpeg_path)
+            if source == 'card_prerender' and not group_id:
+                return {
+                    'statusCode': 200,
+                    'body': json.dumps({
+                        'message': 'Cards pre-rendered',
+                        'cards': cards
+                    })
+                }
+        
+        # Scheduler runs carry no group_id: compile every eligible group for the week
+        if source == 'weekly_scheduler' and not group_id:
+            week_start, week_end = resolve_scheduled_week(week_start_str)
+            print(f"🗓️ Weekly fan-out for {week_start.strftime('%Y-%m-%d')} to {week_end.strftime('%Y-%m-%d')}")
+            summary = compile_all_groups(week_start, week_end, ffmpeg_path, context)
+            return {
+                'statusCode': 200,
+                'body': json.dumps({
+                    'message': 'Weekly compilation fan-out completed',
+                    'cards': cards,
+                    'result': summary
+                }, default=str)
+            }
+        
         if not group_id:
             raise ValueError("group_id is required")
         
@@ -98,14 +341,14 @@ def lambda_handler(event, context):
         print(f"DEBUG: week_end type: {type(week_end)}, value: {week_end}")
         
         # Process the group
-        result = process_group_videos(group_id, week_start, week_end, ffmpeg_path, compilation_id)
+        result = process_group_videos(group_id, week_start, week_end, ffmpeg_path, compilation_id, context, queued_job=bool(event.get('job_id')))
         
         return {
             'statusCode': 200,
             'body': json.dumps({
                 'message': 'Video compilation completed',
                 'result': result
-            })
+            }, default=str)
         }
         
     except Exception as e:
@@ -117,9 +360,11 @@ def lambda_handler(event, context):
             })
         }
 
-def process_group_videos(group_id: int, week_start: datetime, week_end: datetime, ffmpeg_path: str, compilation_id: int = None) -> Dict[str, Any]:
+def process_group_videos(group_id: int, week_start: datetime, week_end: datetime, ffmpeg_path: str, compilation_id: int = None, context=None, queued_job: bool = False) -> Dict[str, Any]:
     """
-    Process videos for a specific group
+    Process videos for a specific group. Under a queued job (queued_job) a
+    failure leaves the compilation 'processing': the queue retries it and marks
+    it failed only once the job is dead-lettered.
     """
     try:
         print(f"🔍 Looking for videos in group {group_id} between {week_start} and {week_end}")
@@ -131,6 +376,9 @@ def process_group_videos(group_id: int, week_start: datetime, week_end: datetime
         
         if not videos:
             print(f"No videos found for group {group_id}")
+            # Nothing to compile; don't leave the row in processing
+            if compilation_id:
+                update_compilation_status(compilation_id, 'failed', None)
             return {
                 'group_id': group_id,
                 'videos_processed': 0,
@@ -140,72 +388,226 @@ def process_group_videos(group_id: int, week_start: datetime, week_end: datetime
         print(f"Found {len(videos)} videos for group {group_id}")
         
         # Create compilation
-        compilation_url = create_video_compilation(group_id, videos, week_start, week_end, ffmpeg_path)
+        timings = {}
+        progress = CompileProgress(compilation_id)
+        compilation_url = create_video_compilation(group_id, videos, week_start, week_end, ffmpeg_path, timings, get_music_track(compilation_id), context, progress)
         
         # Update compilation status in database
         if compilation_id:
+            progress.finish()
             # Extract S3 key from the compilation URL or construct it
             # Ensure week_start is a datetime object
             if isinstance(week_start, str):
                 week_start = datetime.fromisoformat(week_start.replace('Z', '+00:00'))
             compilation_key = f"compilations/{group_id}/{week_start.strftime('%Y%m%d')}_compilation.mp4"
-            update_compilation_status(compilation_id, 'completed', compilation_key)
+            thumbnail_prefix = timings.get('thumbnails', {}).get('prefix')
+            update_compilation_status(compilation_id, 'completed', compilation_key, thumbnail_prefix)
         
         return {
             'group_id': group_id,
             'videos_processed': len(videos),
             'status': 'completed',
             'compilation_url': compilation_url,
-            'videos': videos
+            'videos': videos,
+            'timings': timings
         }
         
     except Exception as e:
         print(f"❌ Error processing group {group_id}: {str(e)}")
-        if compilation_id:
+        if compilation_id and not queued_job:
             update_compilation_status(compilation_id, 'failed', None)
         raise
 
+def resolve_scheduled_week(week_start_str: str = None, now: datetime = None) -> Tuple[datetime, datetime]:
+    """
+    Resolve the scheduler's week. 'auto' means the latest Monday-Sunday week
+    (UTC) that has fully ended, whichever day the rule fires; a week still in
+    progress is never compiled early and its last days never skipped.
+    """
+    if week_start_str and week_start_str != 'auto':
+        week_start = datetime.fromisoformat(week_start_str.replace('Z', '+00:00')).replace(tzinfo=None)
+    else:
+        # The Monday that starts the current week, then one week back
+        reference = now or datetime.utcnow()
+        week_start = reference - timedelta(days=reference.weekday() + 7)
+    week_start = week_start.replace(hour=0, minute=0, second=0, microsecond=0)
+    week_end = (week_start + timedelta(days=6)).replace(hour=23, minute=59, second=59, microsecond=999999)
+    return week_start, week_end
+
+def claim_weekly_compilations(week_start: datetime, week_end: datetime) -> List[Dict[str, Any]]:
+    """
+    Find every active group with submissions in the week and make sure each has a
+    'processing' compilation row. Completed or in-flight rows are reported as skipped.
+    
+    In queue mode each claimed row also gets a compilation_jobs row in the same
+    statement, and a 'processing' row with no queued or running job is reclaimed:
+    nothing is working on it (e.g. an earlier inline run timed out mid-week).
+    """
+    if not DATABASE_URL:
+        print("⚠️ DATABASE_URL not set, cannot find groups for the weekly run")
+        return []
+    
+    query = """
+    WITH eligible AS (
+        SELECT DISTINCT g.id AS group_id
+        FROM groups g
+        JOIN video_submissions vs ON vs.group_id = g.id
+        WHERE COALESCE(g.is_active, TRUE)
+        AND vs.submitted_at >= %(week_start)s
+        AND vs.submitted_at <= %(week_end)s
+    ),
+    existing AS (
+        SELECT wc.id, wc.group_id, wc.status,
+               EXISTS (
+                   SELECT 1 FROM compilation_jobs j
+                   WHERE j.compilation_id = wc.id AND j.status IN ('queued', 'running')
+               ) AS has_job
+        FROM weekly_compilations wc
+        JOIN eligible e ON e.group_id = wc.group_id
+        WHERE wc.week_start = %(week_start)s
+    ),
+    inserted AS (
+        INSERT INTO weekly_compilations (group_id, week_start, week_end, status)
+        SELECT e.group_id, %(week_start)s, %(week_end)s, 'processing'
+        FROM eligible e
+        WHERE NOT EXISTS (SELECT 1 FROM existing x WHERE x.group_id = e.group_id)
+        RETURNING id, group_id
+    ),
+    retried AS (
+        UPDATE weekly_compilations wc
+        SET status = 'processing', completed_at = NULL
+        FROM existing x
+        WHERE wc.id = x.id
+        AND (x.status IN ('pending', 'failed') OR (%(queue)s AND x.status = 'processing' AND NOT x.has_job))
+        RETURNING wc.id, wc.group_id
+    ),
+    queued AS (
+        INSERT INTO compilation_jobs (compilation_id, payload, status, attempts, max_attempts, run_after)
+        SELECT c.id, json_build_object(
+                   'source', 'weekly_fanout',
+                   'group_id', c.group_id,
+                   'compilation_id', c.id,
+                   'week_start', %(week_start_iso)s,
+                   'week_end', %(week_end_iso)s
+               )::text, 'queued', 0, %(max_attempts)s, NOW()
+        FROM (SELECT id, group_id FROM inserted UNION ALL SELECT id, group_id FROM retried) c
+        WHERE %(queue)s
+        AND NOT EXISTS (SELECT 1 FROM existing x WHERE x.id = c.id AND x.has_job)
+        RETURNING compilation_id
+    )
+    SELECT id AS compilation_id, group_id, 'new' AS origin FROM inserted
+    UNION ALL
+    SELECT id, group_id, 'retry' FROM retried
+    UNION ALL
+    SELECT id, group_id, 'skipped_' || status FROM existing WHERE id NOT IN (SELECT id FROM retried)
+    """
+    
+    with db.cursor(dict_rows=True) as cursor:
+        cursor.execute(query, {
+            'week_start': week_start,
+            'week_end': week_end,
+            'week_start_iso': week_start.isoformat(),
+            'week_end_iso': week_end.isoformat(),
+            'queue': FANOUT_MODE == 'queue',
+            'max_attempts': JOB_MAX_ATTEMPTS
+        })
+        rows = [dict(row) for row in cursor.fetchall()]
+    
+    print(f"📊 {len(rows)} groups have submissions this week")
+    return rows
+
+def compile_all_groups(week_start: datetime, week_end: datetime, ffmpeg_path: str, context) -> Dict[str, Any]:
+    """
+    Compile every eligible group: by default as jobs on the compilation queue, or
+    FANOUT_CONCURRENCY at a time in this invocation (FANOUT_MODE=inline), or as
+    one asynchronous invocation per group (FANOUT_MODE=invoke)
+    """
+    rows = claim_weekly_compilations(week_start, week_end)
+    jobs = [row for row in rows if row['origin'] in ('new', 'retry')]
+    groups = [
+        {'group_id': row['group_id'], 'compilation_id': row['compilation_id'], 'status': row['origin']}
+        for row in rows if row not in jobs
+    ]
+    
+    # The jobs were inserted with the claim; compile workers take it from here
+    if FANOUT_MODE == 'queue':
+        for row in jobs:
+            print(f"👥 Group {row['group_id']}: queued")
+            groups.append({'group_id': row['group_id'], 'compilation_id': row['compilation_id'], 'status': 'queued'})
+        return {
+            'week_start': week_start.isoformat(),
+            'week_end': week_end.isoformat(),
+            'mode': FANOUT_MODE,
+            'groups': groups
+        }
+    
+    def compile_group(row):
+        group_status = {'group_id': row['group_id'], 'compilation_id': row['compilation_id']}
+        try:
+            if FANOUT_MODE == 'invoke':
+                lambda_client.invoke(
+                    FunctionName=context.function_name,
+                    InvocationType='Event',
+                    Payload=json.dumps({
+                        'source': 'weekly_fanout',
+                        'group_id': row['group_id'],
+                        'compilation_id': row['compilation_id'],
+                        'week_start': week_start.isoformat(),
+                        'week_end': week_end.isoformat()
+                    })
+                )
+                group_status['status'] = 'dispatched'
+            else:
+                result = process_group_videos(row['group_id'], week_start, week_end, ffmpeg_path, row['compilation_id'], context)
+                group_status['status'] = result['status']
+        except Exception as e:
+            # process_group_videos has already marked the row failed
+            group_status['status'] = 'failed'
+            group_status['error'] = str(e)
+        print(f"👥 Group {row['group_id']}: {group_status['status']}")
+        return group_status
+    
+    with ThreadPoolExecutor(max_workers=max(1, min(FANOUT_CONCURRENCY, len(jobs)))) as executor:
+        groups.extend(executor.map(compile_group, jobs))
+    
+    return {
+        'week_start': week_start.isoformat(),
+        'week_end': week_end.isoformat(),
+        'mode': FANOUT_MODE,
+        'groups': groups
+    }
+
 def get_group_videos_from_db(group_id: int, week_start: datetime, week_end: datetime) -> List[Dict[str, Any]]:
     """
-    Get videos for a specific group within the date range from database
+    Get videos for a specific group within the date range from database.
+    Database errors propagate: an empty list means the week really has no
+    videos, while a failed query should fail the invocation so the job is retried.
     """
-    try:
-        if not DATABASE_URL:
-            print("⚠️ DATABASE_URL not set, using S3 fallback")
-            return get_group_videos_from_s3(group_id, week_start, week_end)
-        
-        print(f"🔗 Connecting to database: {DATABASE_URL.split('@')[1] if '@' in DATABASE_URL else 'local'}")
-        
-        # Connect to database
-        conn = psycopg2.connect(DATABASE_URL)
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
-        
-        # Query videos for the group and date range
-        query = """
-        SELECT id, s3_key, duration, submitted_at as created_at
-        FROM video_submissions 
-        WHERE group_id = %s 
-        AND submitted_at >= %s 
-        AND submitted_at <= %s
-        ORDER BY submitted_at
-        """
-        
-        print(f"🔍 Querying videos for group {group_id} between {week_start} and {week_end}")
+    if not DATABASE_URL:
+        print("⚠️ DATABASE_URL not set, using S3 fallback")
+        return get_group_videos_from_s3(group_id, week_start, week_end)
+    
+    # Query videos for the group and date range; uploads ingest found unreadable are left out
+    query = """
+    SELECT id, s3_key, normalized_s3_key, duration, media_info, submitted_at as created_at
+    FROM video_submissions 
+    WHERE group_id = %s 
+    AND submitted_at >= %s 
+    AND submitted_at <= %s
+    AND (media_status IS NULL OR media_status <> 'invalid')
+    ORDER BY submitted_at
+    """
+    
+    print(f"🔍 Querying videos for group {group_id} between {week_start} and {week_end}")
+    with db.cursor(dict_rows=True) as cursor:
         cursor.execute(query, (group_id, week_start, week_end))
         videos = cursor.fetchall()
-        
-        print(f"📊 Found {len(videos)} videos in database")
-        for video in videos:
-            print(f"  - Video {video['id']}: {video['s3_key']} (submitted: {video['created_at']})")
-        
-        cursor.close()
-        conn.close()
-        
-        return [dict(video) for video in videos]
-        
-    except Exception as e:
-        print(f"❌ Error getting videos from database: {str(e)}")
-        return []
+    
+    print(f"📊 Found {len(videos)} videos in database")
+    for video in videos:
+        print(f"  - Video {video['id']}: {video['s3_key']} (submitted: {video['created_at']}, normalized: {video['normalized_s3_key'] or 'no'})")
+    
+    return [dict(video) for video in videos]
 
 def get_group_videos_from_s3(group_id: int, week_start: datetime, week_end: datetime) -> List[Dict[str, Any]]:
     """
@@ -238,102 +640,1289 @@ def get_group_videos_from_s3(group_id: int, week_start: datetime, week_end: date
         print(f"❌ Error getting videos from S3: {str(e)}")
         return []
 
-def create_video_compilation(group_id: int, videos: List[Dict[str, Any]], week_start: datetime, week_end: datetime, ffmpeg_path: str) -> str:
+class ByteBudget:
+    """
+    Caps how many bytes are being downloaded at once across all workers
+    """
+    def __init__(self, limit_bytes: int):
+        self.limit_bytes = limit_bytes
+        self.in_flight = 0
+        self._cond = threading.Condition()
+
+    def acquire(self, size: int):
+        with self._cond:
+            # A clip bigger than the whole budget is still let through once nothing else is running
+            while self.in_flight > 0 and self.in_flight + size > self.limit_bytes:
+                self._cond.wait()
+            self.in_flight += size
+
+    def release(self, size: int):
+        with self._cond:
+            self.in_flight -= size
+            self._cond.notify_all()
+
+def download_video(s3_key: str, video_path: str, budget: ByteBudget) -> Dict[str, Any]:
+    """
+    Download one source clip, retrying with backoff, and report how long it took
+    """
+    size = s3_client.head_object(Bucket=S3_BUCKET, Key=s3_key)['ContentLength']
+    budget.acquire(size)
+    try:
+        for attempt in range(1, DOWNLOAD_MAX_ATTEMPTS + 1):
+            started = time.monotonic()
+            try:
+                s3_client.download_file(S3_BUCKET, s3_key, video_path, Config=download_transfer_config)
+                elapsed = time.monotonic() - started
+                print(f"Downloaded: {s3_key} ({size / 1e6:.1f} MB in {elapsed:.2f}s, attempt {attempt})")
+                return {'s3_key': s3_key, 'bytes': size, 'seconds': elapsed, 'attempts': attempt}
+            except Exception as e:
+                if attempt == DOWNLOAD_MAX_ATTEMPTS:
+                    raise Exception(f"Download of {s3_key} failed after {attempt} attempts: {e}")
+                backoff = 0.5 * (2 ** (attempt - 1))
+                print(f"⚠️ Download of {s3_key} failed (attempt {attempt}): {e}, retrying in {backoff:.1f}s")
+                time.sleep(backoff)
+    finally:
+        budget.release(size)
+
+def download_videos(s3_keys: List[str], video_files: List[str]) -> Dict[str, Any]:
+    """
+    Download source clips concurrently to the given local paths
+    """
+    started = time.monotonic()
+    budget = ByteBudget(DOWNLOAD_BYTE_BUDGET_MB * 1024 * 1024)
+
+    with ThreadPoolExecutor(max_workers=max(1, min(DOWNLOAD_CONCURRENCY, len(s3_keys)))) as executor:
+        futures = [
+            executor.submit(download_video, s3_key, video_path, budget)
+            for s3_key, video_path in zip(s3_keys, video_files)
+        ]
+        clips = [future.result() for future in futures]
+
+    wall_seconds = time.monotonic() - started
+    total_bytes = sum(clip['bytes'] for clip in clips)
+    serial_seconds = sum(clip['seconds'] for clip in clips)
+    print(f"📥 Downloaded {len(clips)} clips ({total_bytes / 1e6:.1f} MB) in {wall_seconds:.2f}s "
+          f"(sum of clip times {serial_seconds:.2f}s, concurrency {DOWNLOAD_CONCURRENCY})")
+
+    return {
+        'wall_seconds': round(wall_seconds, 3),
+        'serial_seconds': round(serial_seconds, 3),
+        'bytes': total_bytes,
+        'retries': sum(clip['attempts'] - 1 for clip in clips),
+        'clips': clips
+    }
+
+def source_key(video: Dict[str, Any]) -> str:
+    """
+    Prefer the copy normalized at upload time so the compile can stream-copy it
+    """
+    return video.get('normalized_s3_key') or video['s3_key']
+
+def is_streamable(s3_key: str) -> bool:
+    """
+    True when ffmpeg can decode the object front to back without seeking.
+    MP4/MOV files qualify only when the moov atom comes before mdat.
+    """
+    try:
+        base = 0
+        data = b''
+        offset = 0
+        for _ in range(32):
+            # Fetch more of the file whenever the next box header is not buffered
+            if offset + 16 > base + len(data):
+                base = offset
+                data = s3_client.get_object(
+                    Bucket=S3_BUCKET,
+                    Key=s3_key,
+                    Range=f"bytes={offset}-{offset + MOOV_PROBE_BYTES - 1}"
+                )['Body'].read()
+            pos = offset - base
+            size, box_type = struct.unpack('>I4s', data[pos:pos + 8])
+            if size == 1:
+                size = struct.unpack('>Q', data[pos + 8:pos + 16])[0]
+            
+            if offset == 0 and box_type != b'ftyp':
+                return True  # Not ISO-BMFF (e.g. WebM), decodes sequentially
+            if box_type == b'moov':
+                return True
+            if box_type == b'mdat' or size < 8:
+                return False
+            offset += size
+    except Exception as e:
+        print(f"⚠️ Could not inspect {s3_key} layout: {e}")
+    return False
+
+def inspect_sources(videos: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Size of each source clip and whether ffmpeg can stream it, fetched concurrently
+    """
+    def inspect(video):
+        key = source_key(video)
+        size = s3_client.head_object(Bucket=S3_BUCKET, Key=key)['ContentLength']
+        return {'s3_key': key, 'bytes': size, 'streamable': COMPILE_INPUT_MODE == 'stream' and is_streamable(key)}
+    
+    with ThreadPoolExecutor(max_workers=max(1, min(DOWNLOAD_CONCURRENCY, len(videos)))) as executor:
+        return list(executor.map(inspect, videos))
+
+def resolve_inputs(videos: List[Dict[str, Any]], temp_dir: str, sources: List[Dict[str, Any]] = None, stream_all: bool = False) -> Tuple[List[str], Dict[str, Any]]:
+    """
+    Map each clip to something ffmpeg can read, in submission order: a presigned
+    URL when the clip can be streamed, otherwise a local download. With
+    stream_all every clip is streamed; ffmpeg seeks over HTTP for the ones
+    whose moov atom comes last, which is slower but needs no disk.
+    """
+    keys = [source_key(video) for video in videos]
+    if stream_all:
+        streamable = [True] * len(keys)
+    elif sources is not None:
+        streamable = [source['streamable'] for source in sources]
+    elif COMPILE_INPUT_MODE == 'stream':
+        with ThreadPoolExecutor(max_workers=max(1, min(DOWNLOAD_CONCURRENCY, len(keys)))) as executor:
+            streamable = list(executor.map(is_streamable, keys))
+    else:
+        streamable = [False] * len(keys)
+    
+    inputs = []
+    download_keys = []
+    download_paths = []
+    for i, (key, can_stream) in enumerate(zip(keys, streamable)):
+        if can_stream:
+            inputs.append(s3_client.generate_presigned_url(
+                'get_object',
+                Params={'Bucket': S3_BUCKET, 'Key': key},
+                ExpiresIn=INPUT_URL_EXPIRY
+            ))
+        else:
+            video_path = os.path.join(temp_dir, f"video_{i}.mp4")
+            inputs.append(video_path)
+            download_keys.append(key)
+            download_paths.append(video_path)
+    
+    input_mode = 'stream' if stream_all else COMPILE_INPUT_MODE
+    print(f"🔌 Input mode {input_mode}: {len(keys) - len(download_keys)} streamed, {len(download_keys)} downloaded")
+    download_stats = download_videos(download_keys, download_paths) if download_keys else None
+    return inputs, {
+        'mode': input_mode,
+        'streamed': len(keys) - len(download_keys),
+        'downloaded': len(download_keys),
+        'download': download_stats
+    }
+
+# Bytes promised to compiles running in this container, per scratch directory
+scratch_lock = threading.Lock()
+scratch_reserved = {}
+
+def scratch_free(path: str) -> int:
+    """
+    Free bytes under path, less what running compiles have already claimed
+    """
+    try:
+        free = shutil.disk_usage(path).free
+    except OSError:
+        return 0
+    with scratch_lock:
+        return free - scratch_reserved.get(path, 0)
+
+def rate_bytes(rate: str) -> float:
+    """
+    Bytes per second of an ffmpeg bitrate such as '800k'
+    """
+    units = {'k': 1e3, 'M': 1e6}
+    return float(rate[:-1]) * units[rate[-1]] / 8 if rate[-1] in units else float(rate) / 8
+
+def plan_scratch(videos: List[Dict[str, Any]], sources: List[Dict[str, Any]], hls_ladder: List[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Work out the scratch space a compile needs and where to put it:
+    
+    - memory: everything fits in tmpfs (SCRATCH_MEMORY_MB)
+    - disk:   everything fits on the scratch disk
+    - stream: inputs are streamed, the output goes straight to S3 and each
+              segment is dropped once it is in the segment cache, so only the
+              segments being encoded (and the HLS ladder) are on disk
+    
+    The HLS ladder is given up before the compile is. Raises when even the
+    stream plan doesn't fit, before anything is downloaded.
+    """
+    if hls_ladder is None:
+        hls_ladder = HLS_LADDER if HLS_ENABLED else []
+    video_rate = SCRATCH_VIDEO_MBPS * 1e6 / 8
+    
+    segments = []
+    uncached = 0
+    total_duration = 0.0
+    for video, source in zip(videos, sources):
+        probe = known_probe(video)
+        duration = (probe or {}).get('duration') or float(video.get('duration') or 0)
+        total_duration += duration
+        if probe is not None and not profile_mismatches(probe):
+            continue
+        # Without a duration, assume the segment is no bigger than the source
+        size = duration * video_rate if duration else source['bytes']
+        segments.append(size)
+        if not video.get('id'):
+            uncached += size  # No segment cache key, so it stays on disk
+    
+    downloads = sum(source['bytes'] for source in sources if not source['streamable'])
+    output = total_duration * video_rate if COMPILE_OUTPUT_MODE == 'file' else 0
+    hls = total_duration * sum(rate_bytes(rung['video_bitrate']) + rate_bytes(rung['audio_bitrate']) for rung in hls_ladder)
+    local_bytes = downloads + sum(segments) + output + hls
+    in_flight = sum(sorted(segments, reverse=True)[:COMPILE_WORKERS])
+    stream_bytes = in_flight + uncached + hls
+    
+    memory_free = 0
+    if os.path.isdir(SCRATCH_TMPFS_DIR) and os.access(SCRATCH_TMPFS_DIR, os.W_OK):
+        memory_free = min(SCRATCH_MEMORY_MB * 1024 * 1024, scratch_free(SCRATCH_TMPFS_DIR))
+    disk_free = scratch_free(SCRATCH_DISK_DIR) - SCRATCH_RESERVE_MB * 1024 * 1024
+    
+    plan = {'hls': bool(hls_ladder), 'clip_seconds': round(total_duration, 1), 'disk_free_mb': round(disk_free / 1e6)}
+    if local_bytes <= memory_free:
+        plan.update({'mode': 'memory', 'dir': SCRATCH_TMPFS_DIR, 'bytes': int(local_bytes)})
+    elif local_bytes <= disk_free:
+        plan.update({'mode': 'disk', 'dir': SCRATCH_DISK_DIR, 'bytes': int(local_bytes)})
+    elif stream_bytes <= disk_free:
+        plan.update({'mode': 'stream', 'dir': SCRATCH_DISK_DIR, 'bytes': int(stream_bytes)})
+    elif hls_ladder and stream_bytes - hls <= disk_free:
+        print(f"⚠️ No room for the HLS ladder ({hls / 1e6:.0f} MB), compiling the MP4 only")
+        plan.update({'mode': 'stream', 'dir': SCRATCH_DISK_DIR, 'bytes': int(stream_bytes - hls), 'hls': False})
+    else:
+        raise Exception(
+            f"Not enough scratch space: {len(videos)} clips ({total_duration:.0f}s) need at least "
+            f"{(stream_bytes - hls) / 1e6:.0f} MB even when streamed, {disk_free / 1e6:.0f} MB free in {SCRATCH_DISK_DIR}"
+        )
+    
+    print(f"💾 Scratch {plan['mode']} in {plan['dir']}: ~{plan['bytes'] / 1e6:.0f} MB "
+          f"(all local {local_bytes / 1e6:.0f} MB, streamed {stream_bytes / 1e6:.0f} MB, disk free {disk_free / 1e6:.0f} MB)")
+    return plan
+
+@contextmanager
+def reserve_scratch(plan: Dict[str, Any]):
+    """
+    Hold the plan's bytes against its directory so concurrent compiles in this
+    container don't plan with the same free space
+    """
+    with scratch_lock:
+        scratch_reserved[plan['dir']] = scratch_reserved.get(plan['dir'], 0) + plan['bytes']
+    try:
+        yield
+    finally:
+        with scratch_lock:
+            scratch_reserved[plan['dir']] -= plan['bytes']
+
+def is_url(path: str) -> bool:
+    return path.startswith(('http://', 'https://'))
+
+def input_args(path: str) -> List[str]:
+    """
+    ffmpeg arguments for one input
+    """
+    if is_url(path):
+        # Resume a dropped S3 connection instead of failing the whole compile
+        return ['-reconnect', '1', '-reconnect_on_network_error', '1', '-reconnect_delay_max', '5', '-i', path]
+    return ['-i', path]
+
+def format_cmd(cmd: List[str]) -> str:
+    """
+    Printable command line with presigned URL signatures stripped
+    """
+    return ' '.join(arg.split('?')[0] if is_url(arg) else arg for arg in cmd)
+
+FFMPEG_PROGRESS_KEYS = {
+    'frame', 'fps', 'bitrate', 'total_size', 'out_time_us', 'out_time_ms', 'out_time',
+    'dup_frames', 'drop_frames', 'speed', 'progress'
+}
+
+def with_progress(cmd: List[str]) -> List[str]:
+    """
+    Have ffmpeg write machine-readable progress to stderr instead of its stats line
+    """
+    return cmd[:1] + ['-progress', 'pipe:2', '-nostats'] + cmd[1:]
+
+def read_ffmpeg_stderr(stream, on_progress=None) -> str:
+    """
+    Read ffmpeg's stderr to the end, passing the seconds encoded so far to
+    on_progress after each -progress block. Returns the log without the progress lines.
+    """
+    log = []
+    for raw in stream:
+        line = raw.decode(errors='replace') if isinstance(raw, bytes) else raw
+        key, sep, value = line.strip().partition('=')
+        if sep and (key in FFMPEG_PROGRESS_KEYS or key.startswith('stream_')):
+            # out_time_us is negative or N/A until the first frame is out
+            if key == 'out_time_us' and on_progress and value.isdigit():
+                on_progress(int(value) / 1e6)
+            continue
+        log.append(line)
+    return ''.join(log)
+
+def run_ffmpeg(cmd: List[str], on_progress=None) -> subprocess.CompletedProcess:
+    """
+    subprocess.run for ffmpeg; with on_progress, progress is reported while it runs
+    """
+    if on_progress is None:
+        return subprocess.run(cmd, capture_output=True, text=True)
+    process = subprocess.Popen(with_progress(cmd), stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, errors='replace')
+    stderr = read_ffmpeg_stderr(process.stderr, on_progress)
+    return subprocess.CompletedProcess(cmd, process.wait(), '', stderr)
+
+def get_ffprobe_path(ffmpeg_path: str) -> str:
+    """
+    ffprobe ships next to ffmpeg in the Lambda layer
+    """
+    ffmpeg_dir = os.path.dirname(ffmpeg_path)
+    return os.path.join(ffmpeg_dir, 'ffprobe') if ffmpeg_dir else 'ffprobe'
+
+def encoder_args(profile: Dict[str, Any] = TARGET_PROFILE, settings: Dict[str, Any] = ENCODER_SETTINGS) -> List[str]:
+    """
+    Output arguments that produce a stream matching the given profile
+    """
+    level = profile['level']
+    return [
+        '-c:v', 'libx264',
+        '-preset', settings['preset'],
+        '-crf', str(settings['crf']),
+        '-profile:v', profile['video_profile'].lower(),
+        '-level', f"{level // 10}.{level % 10}",
+        '-pix_fmt', profile['pix_fmt'],
+        '-r', profile['fps'],
+        '-c:a', 'aac',
+        '-ar', str(profile['sample_rate']),
+        '-ac', str(profile['channels'])
+    ]
+
+def probe_media(ffprobe_path: str, path: str) -> Dict[str, Any]:
+    """
+    Read the stream parameters of a media file with ffprobe
+    """
+    cmd = [ffprobe_path, '-v', 'error', '-show_streams', '-show_format', '-of', 'json', path]
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise Exception(f"ffprobe failed for {path}: {result.stderr}")
+    
+    info = json.loads(result.stdout)
+    streams = info.get('streams', [])
+    video = next((st for st in streams if st.get('codec_type') == 'video'), None)
+    audio = next((st for st in streams if st.get('codec_type') == 'audio'), None)
+    
+    rotation = 0
+    if video:
+        rotation = int(video.get('tags', {}).get('rotate', 0))
+        for side_data in video.get('side_data_list', []):
+            if 'rotation' in side_data:
+                rotation = int(side_data['rotation'])
+    
+    return {
+        'video_codec': video.get('codec_name') if video else None,
+        'video_profile': video.get('profile') if video else None,
+        'level': video.get('level') if video else None,
+        'width': video.get('width') if video else None,
+        'height': video.get('height') if video else None,
+        'fps': video.get('r_frame_rate') if video else None,
+        'pix_fmt': video.get('pix_fmt') if video else None,
+        'rotation': rotation % 360,
+        'audio_codec': audio.get('codec_name') if audio else None,
+        'sample_rate': int(audio['sample_rate']) if audio and audio.get('sample_rate') else None,
+        'channels': audio.get('channels') if audio else None,
+        'duration': float(info.get('format', {}).get('duration') or 0),
+        'bitrate': int(info.get('format', {}).get('bit_rate') or 0) or None
+    }
+
+def probe_keyframe_interval(ffprobe_path: str, path: str, window: int = 60):
+    """
+    Average seconds between video keyframes over the first `window` seconds,
+    read from packet flags (no decoding)
+    """
+    cmd = [ffprobe_path, '-v', 'error', '-select_streams', 'v:0', '-read_intervals', f'%+{window}',
+           '-show_entries', 'packet=pts_time,flags', '-of', 'csv=p=0', path]
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        return None
+    
+    keyframes = []
+    for line in result.stdout.splitlines():
+        fields = line.split(',')
+        if len(fields) >= 2 and 'K' in fields[1] and fields[0] not in ('', 'N/A'):
+            keyframes.append(float(fields[0]))
+    keyframes.sort()
+    if len(keyframes) < 2:
+        return None
+    return round((keyframes[-1] - keyframes[0]) / (len(keyframes) - 1), 3)
+
+def known_probe(video: Dict[str, Any]):
+    """
+    The probe stored at ingest for the file a compile will read (the normalized
+    copy if there is one), or None if the submission was never probed
+    """
+    media_info = video.get('media_info')
+    if not media_info:
+        return None
+    if isinstance(media_info, str):
+        media_info = json.loads(media_info)
+    return media_info.get('normalized' if video.get('normalized_s3_key') else 'source')
+
+def profile_mismatches(probe: Dict[str, Any], profile: Dict[str, Any] = TARGET_PROFILE) -> List[str]:
+    """
+    List the profile fields a probed input does not match
+    """
+    mismatches = [
+        f"{field}={probe.get(field)!r} (want {expected!r})"
+        for field, expected in profile.items()
+        if probe.get(field) != expected
+    ]
+    if probe.get('rotation'):
+        mismatches.append(f"rotation={probe['rotation']}")
+    return mismatches
+
+def scale_pad_filter(profile: Dict[str, Any] = TARGET_PROFILE) -> str:
+    """
+    Letterbox any input into the profile's frame size
+    """
+    width, height = profile['width'], profile['height']
+    return f"scale={width}:{height}:force_original_aspect_ratio=decrease,pad={width}:{height}:(ow-iw)/2:(oh-ih)/2,setsar=1"
+
+def audio_format_filter(profile: Dict[str, Any] = TARGET_PROFILE) -> str:
+    return f"aformat=sample_fmts=fltp:sample_rates={profile['sample_rate']}:channel_layouts=stereo"
+
+def normalize_clip(input_path: str, output_path: str, ffmpeg_path: str, profile: Dict[str, Any] = TARGET_PROFILE, settings: Dict[str, Any] = ENCODER_SETTINGS, probe: Dict[str, Any] = None, threads: int = None, on_progress=None) -> Dict[str, Any]:
+    """
+    Convert one clip to the intermediate profile so compiles can stream-copy it
+    """
+    if probe is None:
+        probe = probe_media(get_ffprobe_path(ffmpeg_path), input_path)
+    
+    cmd = [ffmpeg_path, '-y'] + input_args(input_path)
+    if probe['audio_codec'] is None:
+        # Clips without sound get a silent track so every segment has the same streams
+        cmd.extend(['-f', 'lavfi', '-i', f"anullsrc=channel_layout=stereo:sample_rate={profile['sample_rate']}", '-shortest'])
+        audio_map = '1:a:0'
+    else:
+        audio_map = '0:a:0'
+    
+    cmd.extend([
+        '-map', '0:v:0',
+        '-map', audio_map,
+        '-vf', scale_pad_filter(profile),
+        '-af', audio_format_filter(profile)
+    ] + encoder_args(profile, settings))
+    if threads:
+        cmd.extend(['-threads', str(threads)])
+    cmd.extend(['-movflags', '+faststart', output_path])
+    
+    result = run_ffmpeg(cmd, on_progress)
+    if result.returncode != 0:
+        raise Exception(f"FFmpeg normalization failed: {result.stderr}")
+    return probe
+
+def plan_compilation(ffprobe_path: str, input_files: List[str], profile: Dict[str, Any] = TARGET_PROFILE, known_probes: List[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Probe every input and list the ones that have to be re-encoded before they
+    can be stream-copied into the compilation. Inputs with a probe stored at
+    ingest (known_probes) are not read again.
+    """
+    known_probes = known_probes or [None] * len(input_files)
+    
+    def probe(i):
+        if known_probes[i]:
+            return known_probes[i]
+        try:
+            return probe_media(ffprobe_path, input_files[i])
+        except Exception as e:
+            print(f"⚠️ Could not probe {input_files[i]}: {e}")
+            return None
+    
+    reused = sum(1 for known in known_probes if known)
+    if reused:
+        print(f"🗂️ Using stored metadata for {reused} of {len(input_files)} inputs")
+    with ThreadPoolExecutor(max_workers=max(1, min(DOWNLOAD_CONCURRENCY, len(input_files)))) as executor:
+        probes = list(executor.map(probe, range(len(input_files))))
+    
+    reencode = []
+    for i, (path, info) in enumerate(zip(input_files, probes)):
+        mismatches = profile_mismatches(info, profile) if info else ['unreadable']
+        if mismatches:
+            print(f"🎞️ Input {i} needs re-encoding: {', '.join(mismatches)}")
+            reencode.append(i)
+    
+    if not reencode:
+        print(f"⚡ All {len(input_files)} inputs match the output profile, using stream copy")
+    return {
+        'strategy': 'segments' if reencode else 'copy',
+        'probes': probes,
+        'reencode': reencode
+    }
+
+def encode_cost(probe: Dict[str, Any], profile: Dict[str, Any] = TARGET_PROFILE) -> float:
+    """
+    Single-vCPU seconds to re-encode one clip at a throughput of 1.0: its
+    duration, plus decode work that grows with the input resolution
+    """
+    if not probe:
+        return 0.0
+    out_pixels = profile['width'] * profile['height']
+    in_pixels = (probe.get('width') or profile['width']) * (probe.get('height') or profile['height'])
+    return (probe.get('duration') or 0) * (1 + DECODE_COST * in_pixels / out_pixels)
+
+def plan_encode_budget(plan: Dict[str, Any], remaining_seconds: float, profile: Dict[str, Any] = TARGET_PROFILE) -> Dict[str, Any]:
+    """
+    Pick the best preset and HLS ladder whose estimated run time fits in the
+    remaining invocation time. Presets are lowered first, then the top HLS
+    rungs are dropped. When even the fastest option doesn't fit, the segment
+    encodes are split across worker invocations.
+    """
+    cores = COMPILE_WORKERS
+    costs = [encode_cost(plan['probes'][i], profile) for i in plan['reencode']]
+    duration = sum(probe.get('duration') or 0 for probe in plan['probes'] if probe)
+    workers = max(1, min(cores, len(costs)))
+    threads = max(1, cores // workers)
+    # Concat/upload and the preview renders scale with the compilation length, not the preset
+    fixed = 2 * duration / COPY_THROUGHPUT
+    budget = remaining_seconds - BUDGET_SAFETY_SECONDS - fixed
+    out_pixels = profile['width'] * profile['height']
+    
+    def estimate(preset, ladder):
+        throughput = ENCODE_THROUGHPUT[preset]
+        # Wall time is bounded by both the total work and the longest single clip
+        segments = max(sum(costs) / cores, max(costs, default=0) / threads) / throughput
+        ladder_pixels = sum(rung['width'] * rung['height'] for rung in ladder) / out_pixels
+        hls = duration * ladder_pixels / (throughput * cores)
+        return segments, hls
+    
+    full_ladder = HLS_LADDER if HLS_ENABLED else []
+    candidates = [(preset, full_ladder) for preset in ENCODE_PRESETS]
+    for size in range(len(full_ladder) - 1, -1, -1):
+        candidates.append((ENCODE_PRESETS[-1], full_ladder[:size]))
+    
+    decision = {
+        'remaining_seconds': round(remaining_seconds, 1),
+        'clip_seconds': round(duration, 1),
+        'reencode_clips': len(costs),
+        'workers': workers,
+        'threads_per_job': threads,
+        'split': 0
+    }
+    for preset, ladder in candidates:
+        segments, hls = estimate(preset, ladder)
+        if segments + hls <= budget:
+            decision.update({
+                'settings': dict(ENCODER_SETTINGS, preset=preset),
+                'hls_ladder': ladder,
+                'estimate_seconds': round(segments + hls + fixed, 1)
+            })
+            return decision
+    
+    # Nothing fits here: fastest preset, no ladder, and spread the clips over enough invocations
+    segments, _ = estimate(ENCODE_PRESETS[-1], [])
+    worker_budget = max(1.0, budget - SPLIT_INVOKE_OVERHEAD)
+    decision.update({
+        'settings': dict(ENCODER_SETTINGS, preset=ENCODE_PRESETS[-1]),
+        'hls_ladder': [],
+        'estimate_seconds': round(segments + fixed, 1),
+        'split': min(ENCODE_SPLIT_MAX_WORKERS, max(2, -(-int(segments) // int(worker_budget)))) if ENCODE_SPLIT == 'invoke' else 0
+    })
+    return decision
+
+def split_jobs(jobs: List[int], costs: Dict[int, float], parts: int) -> List[List[int]]:
+    """
+    Spread jobs over parts with roughly equal total cost (longest first, onto the lightest part)
+    """
+    chunks = [[] for _ in range(parts)]
+    loads = [0.0] * parts
+    for i in sorted(jobs, key=lambda j: costs[j], reverse=True):
+        lightest = loads.index(min(loads))
+        chunks[lightest].append(i)
+        loads[lightest] += costs[i]
+    return [chunk for chunk in chunks if chunk]
+
+def dispatch_segment_workers(chunks: List[List[Dict[str, Any]]], settings: Dict[str, Any], context) -> Dict[str, Any]:
+    """
+    Run each chunk of clips in its own invocation and wait for all of them. The
+    workers only fill the segment cache; anything they miss is encoded here.
+    """
+    started = time.monotonic()
+    
+    def invoke(videos):
+        try:
+            response = worker_lambda_client.invoke(
+                FunctionName=context.function_name,
+                InvocationType='RequestResponse',
+                Payload=json.dumps({
+                    'source': 'segment_worker',
+                    'videos': [
+                        {key: video.get(key) for key in ('id', 's3_key', 'normalized_s3_key', 'media_info')}
+                        for video in videos
+                    ],
+                    'settings': settings
+                }, default=str)
+            )
+            return json.loads(response['Payload'].read()).get('statusCode') == 200
+        except Exception as e:
+            print(f"⚠️ Segment worker failed, its clips will be encoded here: {e}")
+            return False
+    
+    with ThreadPoolExecutor(max_workers=len(chunks)) as executor:
+        results = list(executor.map(invoke, chunks))
+    
+    stats = {
+        'workers': len(chunks),
+        'succeeded': sum(1 for ok in results if ok),
+        'wall_seconds': round(time.monotonic() - started, 3)
+    }
+    print(f"🪓 Split encode over {len(chunks)} workers: {stats['succeeded']} succeeded in {stats['wall_seconds']}s")
+    return stats
+
+def encode_segment_chunk(videos: List[Dict[str, Any]], settings: Dict[str, Any], ffmpeg_path: str) -> Dict[str, Any]:
+    """
+    Segment worker: encode the given clips into the segment cache
+    """
+    with tempfile.TemporaryDirectory() as temp_dir:
+        input_files, _ = resolve_inputs(videos, temp_dir)
+        plan = {'reencode': list(range(len(videos))), 'probes': [known_probe(video) for video in videos]}
+        keys = [segment_cache_key(video, settings=settings) for video in videos]
+        _, stats = encode_segments(input_files, plan, temp_dir, ffmpeg_path, segment_keys=keys, settings=settings)
+    return stats
+
+def calibrate_encoder(ffmpeg_path: str, seconds: int = 10, profile: Dict[str, Any] = TARGET_PROFILE) -> Dict[str, float]:
+    """
+    Measure single-thread libx264 throughput per preset on this machine, in the
+    units ENCODE_THROUGHPUT expects. Synthetic input encodes a little faster
+    than camera footage, so treat the figures as an upper bound.
+    """
+    throughput = {}
+    for preset in ENCODE_PRESETS:
+        cmd = [
+            ffmpeg_path, '-v', 'error',
+            '-f', 'lavfi', '-i', f"testsrc2=size={profile['width']}x{profile['height']}:rate={profile['fps']}",
+            '-t', str(seconds),
+            '-c:v', 'libx264', '-preset', preset, '-crf', str(ENCODER_SETTINGS['crf']), '-threads', '1',
+            '-f', 'null', '-'
+        ]
+        started = time.monotonic()
+        subprocess.run(cmd, capture_output=True, check=True)
+        throughput[preset] = round(seconds / (time.monotonic() - started), 2)
+        print(f"⏱️ {preset}: {throughput[preset]}x realtime per vCPU")
+    return throughput
+
+def segment_cache_key(video: Dict[str, Any], profile: Dict[str, Any] = TARGET_PROFILE, settings: Dict[str, Any] = ENCODER_SETTINGS) -> str:
+    """
+    S3 key of a submission's encoded segment. The source key is part of the hash
+    so a replaced or newly normalized clip is encoded again. The preset is not:
+    every preset in ENCODE_PRESETS produces the same profile, so a segment from
+    any of them stitches with the rest, and a budget that lands on a different
+    preset doesn't invalidate the cache.
+    """
+    settings = {key: value for key, value in settings.items() if key != 'preset'}
+    spec = {'source': source_key(video), 'profile': profile, 'settings': settings}
+    digest = hashlib.sha256(json.dumps(spec, sort_keys=True).encode()).hexdigest()[:32]
+    return f"{SEGMENT_CACHE_PREFIX}/{video.get('id', 'unknown')}/{digest}.mp4"
+
+def find_cached_segments(segment_keys: List[str], indexes: List[int]) -> List[int]:
+    """The indexes whose segment is already in the segment cache"""
+    candidates = [i for i in indexes if segment_keys[i]]
+    
+    def cached(i):
+        try:
+            s3_client.head_object(Bucket=S3_BUCKET, Key=segment_keys[i])
+            return True
+        except Exception:
+            return False
+    
+    with ThreadPoolExecutor(max_workers=max(1, min(16, len(candidates)))) as executor:
+        hits = list(executor.map(cached, candidates))
+    return [i for i, hit in zip(candidates, hits) if hit]
+
+def fetch_cached_segment(s3_key: str, segment_path: str, stream: bool = COMPILE_INPUT_MODE == 'stream'):
+    """
+    Return something ffmpeg can read for a cached segment, or None on a miss
+    """
+    try:
+        s3_client.head_object(Bucket=S3_BUCKET, Key=s3_key)
+    except Exception:
+        return None
+    if stream:
+        # Segments are written fast-start, so they can always be streamed
+        return s3_client.generate_presigned_url(
+            'get_object',
+            Params={'Bucket': S3_BUCKET, 'Key': s3_key},
+            ExpiresIn=INPUT_URL_EXPIRY
+        )
+    s3_client.download_file(S3_BUCKET, s3_key, segment_path, Config=download_transfer_config)
+    return segment_path
+
+def encode_segments(input_files: List[str], plan: Dict[str, Any], temp_dir: str, ffmpeg_path: str, profile: Dict[str, Any] = TARGET_PROFILE, segment_keys: List[str] = None, settings: Dict[str, Any] = ENCODER_SETTINGS, progress=None, stream_segments: bool = False) -> Tuple[List[str], Dict[str, Any]]:
+    """
+    Re-encode each mismatched input as its own ffmpeg process, one per CPU, and
+    return all inputs in order, ready to be stream-copied together. Inputs with a
+    segment key reuse the segment from an earlier run when it exists. Each job
+    reports its encoded seconds to progress (a CompileProgress) separately.
+    With stream_segments, a segment's local file is deleted once it is in the
+    segment cache and the concat reads it back from S3.
+    """
+    jobs = plan['reencode']
+    segment_files = list(input_files)
+    segment_keys = segment_keys or [None] * len(input_files)
+    if not jobs:
+        return segment_files, {'jobs': 0, 'cached': 0, 'workers': 0, 'wall_seconds': 0, 'serial_seconds': 0}
+    
+    # Spread the cores over the jobs: many clips get one thread each, a few clips get several
+    workers = max(1, min(COMPILE_WORKERS, len(jobs)))
+    threads = max(1, COMPILE_WORKERS // workers)
+    started = time.monotonic()
+    
+    def encode(i):
+        segment_path = os.path.join(temp_dir, f"segment_{i}.mp4")
+        job_started = time.monotonic()
+        report = (lambda seconds: progress.update(seconds, key=i)) if progress else None
+        cache_key = segment_keys[i]
+        if cache_key:
+            cached = fetch_cached_segment(cache_key, segment_path, stream=stream_segments or COMPILE_INPUT_MODE == 'stream')
+            if cached:
+                if report:
+                    report((plan['probes'][i] or {}).get('duration') or 0)
+                return i, cached, time.monotonic() - job_started, True
+        
+        normalize_clip(input_files[i], segment_path, ffmpeg_path, profile, settings, probe=plan['probes'][i], threads=threads, on_progress=report)
+        if cache_key:
+            try:
+                s3_client.upload_file(segment_path, S3_BUCKET, cache_key)
+                if stream_segments:
+                    os.remove(segment_path)
+                    segment_path = s3_client.generate_presigned_url(
+                        'get_object',
+                        Params={'Bucket': S3_BUCKET, 'Key': cache_key},
+                        ExpiresIn=INPUT_URL_EXPIRY
+                    )
+            except Exception as e:
+                print(f"⚠️ Could not store segment {cache_key}: {e}")
+        return i, segment_path, time.monotonic() - job_started, False
+    
+    # Each job is an ffmpeg child process, so a thread per job is enough to keep every core busy
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(encode, jobs))
+    
+    for i, segment_path, _, _ in results:
+        segment_files[i] = segment_path
+    
+    wall_seconds = time.monotonic() - started
+    serial_seconds = sum(seconds for _, _, seconds, _ in results)
+    cached = sum(1 for _, _, _, hit in results if hit)
+    print(f"🧵 Encoded {len(jobs) - cached} segments ({cached} reused from earlier runs) on {workers} workers x {threads} threads "
+          f"in {wall_seconds:.2f}s (sum of job times {serial_seconds:.2f}s)")
+    return segment_files, {
+        'jobs': len(jobs),
+        'cached': cached,
+        'workers': workers,
+        'threads_per_job': threads,
+        'wall_seconds': round(wall_seconds, 3),
+        'serial_seconds': round(serial_seconds, 3)
+    }
+
+def music_mix_filter(voice: str, music: str, duration: float) -> str:
+    """
+    Filter graph that lays the music under the clip audio: faded in and out,
+    and ducked by a sidechain compressor keyed on the clip audio. Output is [outa].
+    """
+    fade_out_start = max(0.0, duration - MUSIC_FADE_OUT)
+    return ';'.join([
+        f"{music}atrim=0:{duration:.3f},asetpts=PTS-STARTPTS,volume={MUSIC_VOLUME},"
+        f"afade=t=in:st=0:d={MUSIC_FADE_IN},afade=t=out:st={fade_out_start:.3f}:d={MUSIC_FADE_OUT}[music]",
+        f"{voice}asplit=2[voice][key]",
+        "[music][key]sidechaincompress=threshold=0.05:ratio=8:attack=20:release=400[ducked]",
+        "[voice][ducked]amix=inputs=2:duration=first:dropout_transition=0:normalize=0[outa]"
+    ])
+
+def concat_copy_cmd(input_files: List[str], temp_dir: str, ffmpeg_path: str, music_path: str = None, duration: float = None) -> List[str]:
+    """
+    Join inputs that share one profile with the concat demuxer, without
+    re-encoding the video. With music, only the audio is re-encoded in the same pass.
+    """
+    list_path = os.path.join(temp_dir, 'concat.txt')
+    with open(list_path, 'w') as f:
+        for path in input_files:
+            escaped = path.replace("'", "'\\''")
+            f.write(f"file '{escaped}'\n")
+    
+    cmd = [
+        ffmpeg_path, '-y',
+        '-f', 'concat', '-safe', '0',
+        '-protocol_whitelist', 'file,http,https,tcp,tls,crypto',
+        '-i', list_path
+    ]
+    if not music_path:
+        return cmd + ['-c', 'copy']
+    
+    # Loop the track so short songs still cover the whole compilation
+    return cmd + [
+        '-stream_loop', '-1', '-i', music_path,
+        '-filter_complex', music_mix_filter('[0:a]', '[1:a]', duration),
+        '-map', '0:v', '-map', '[outa]',
+        '-c:v', 'copy',
+        '-c:a', 'aac', '-b:a', MUSIC_AUDIO_BITRATE,
+        '-ar', str(TARGET_PROFILE['sample_rate']), '-ac', str(TARGET_PROFILE['channels'])
+    ]
+
+def filter_complex_cmd(input_files: List[str], ffmpeg_path: str, profile: Dict[str, Any] = TARGET_PROFILE, music_path: str = None, duration: float = None, settings: Dict[str, Any] = ENCODER_SETTINGS) -> List[str]:
+    """
+    Scale, pad and re-encode every input in one filter graph
+    """
+    cmd = [ffmpeg_path, '-y']  # -y to overwrite output
+    for f in input_files:
+        cmd.extend(input_args(f))
+    if music_path:
+        cmd.extend(['-stream_loop', '-1', '-i', music_path])
+    
+    # Filter complex for concatenation and scaling
+    filter_parts = []
+    concat_inputs = []
+    for i, _ in enumerate(input_files):
+        filter_parts.append(f"[{i}:v]{scale_pad_filter(profile)}[v{i}]")
+        filter_parts.append(f"[{i}:a]{audio_format_filter(profile)}[a{i}]")
+        concat_inputs.append(f"[v{i}][a{i}]")
+    
+    filter_complex = ';'.join(filter_parts) + f";{''.join(concat_inputs)}concat=n={len(input_files)}:v=1:a=1[outv][outa]"
+    if music_path:
+        filter_complex = filter_complex.replace('[outa]', '[cata]') + ';' + music_mix_filter('[cata]', f"[{len(input_files)}:a]", duration)
+    
+    cmd.extend([
+        '-filter_complex', filter_complex,
+        '-map', '[outv]',
+        '-map', '[outa]'
+    ] + encoder_args(profile, settings))
+    return cmd
+
+def read_part(stream, size: int) -> bytes:
+    """
+    Read up to size bytes from a pipe, only returning short at end of stream
+    """
+    chunks = []
+    remaining = size
+    while remaining > 0:
+        chunk = stream.read(remaining)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        remaining -= len(chunk)
+    return b''.join(chunks)
+
+def upload_part(s3_key: str, upload_id: str, part_number: int, body: bytes) -> Dict[str, Any]:
+    """
+    Upload one multipart part; S3 rejects it if the body does not match our SHA-256
+    """
+    checksum = base64.b64encode(hashlib.sha256(body).digest()).decode()
+    response = s3_client.upload_part(
+        Bucket=S3_BUCKET,
+        Key=s3_key,
+        UploadId=upload_id,
+        PartNumber=part_number,
+        Body=body,
+        ChecksumAlgorithm='SHA256',
+        ChecksumSHA256=checksum
+    )
+    if response.get('ChecksumSHA256') != checksum:
+        raise Exception(f"Checksum mismatch on part {part_number} of {s3_key}")
+    return {'PartNumber': part_number, 'ETag': response['ETag'], 'ChecksumSHA256': checksum}
+
+def stream_to_s3(cmd: List[str], s3_key: str, on_progress=None) -> Dict[str, Any]:
+    """
+    Run ffmpeg writing to stdout and send its output to S3 as a multipart upload
+    while it is still encoding
+    """
+    part_size = UPLOAD_PART_SIZE_MB * 1024 * 1024
+    # Start the upload first: if S3 refuses it, there is no ffmpeg left blocked on a full pipe
+    upload_id = s3_client.create_multipart_upload(
+        Bucket=S3_BUCKET,
+        Key=s3_key,
+        ContentType='video/mp4',
+        ChecksumAlgorithm='SHA256'
+    )['UploadId']
+    
+    print(f"Running FFmpeg command: {format_cmd(cmd)}")
+    if on_progress:
+        cmd = with_progress(cmd)
+    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    
+    # Drain stderr on the side so a chatty ffmpeg never blocks on a full pipe
+    stderr_chunks = []
+    stderr_thread = threading.Thread(target=lambda: stderr_chunks.append(read_ffmpeg_stderr(process.stderr, on_progress)))
+    stderr_thread.start()
+    
+    # Bound the parts held in memory while earlier ones are still uploading
+    slots = threading.BoundedSemaphore(UPLOAD_PART_CONCURRENCY)
+    total_bytes = 0
+    try:
+        with ThreadPoolExecutor(max_workers=UPLOAD_PART_CONCURRENCY) as executor:
+            futures = []
+            part_number = 1
+            while True:
+                body = read_part(process.stdout, part_size)
+                if not body:
+                    break
+                total_bytes += len(body)
+                slots.acquire()
+                future = executor.submit(upload_part, s3_key, upload_id, part_number, body)
+                future.add_done_callback(lambda _: slots.release())
+                futures.append(future)
+                part_number += 1
+            parts = [future.result() for future in futures]
+        
+        returncode = process.wait()
+        stderr_thread.join()
+        if returncode != 0:
+            raise Exception(f"FFmpeg failed: {''.join(stderr_chunks)}")
+        if not parts:
+            raise Exception("FFmpeg produced no output")
+        
+        s3_client.complete_multipart_upload(
+            Bucket=S3_BUCKET,
+            Key=s3_key,
+            UploadId=upload_id,
+            MultipartUpload={'Parts': parts}
+        )
+        print(f"✅ Streamed {total_bytes / 1e6:.1f} MB to {S3_BUCKET}/{s3_key} in {len(parts)} checksummed parts")
+        return {'mode': 'stream', 'bytes': total_bytes, 'parts': len(parts)}
+        
+    except Exception:
+        process.kill()
+        process.wait()
+        stderr_thread.join()
+        s3_client.abort_multipart_upload(Bucket=S3_BUCKET, Key=s3_key, UploadId=upload_id)
+        raise
+
+def write_output(cmd: List[str], s3_key: str, temp_dir: str, on_progress=None, output_mode: str = COMPILE_OUTPUT_MODE) -> Dict[str, Any]:
+    """
+    Finish an ffmpeg command with its output and get the result into S3
+    """
+    if output_mode == 'stream':
+        # Fragmented MP4 can be written front to back, so it never needs to seek the pipe
+        return stream_to_s3(cmd + [
+            '-movflags', 'frag_keyframe+empty_moov+default_base_moof',
+            '-f', 'mp4',
+            'pipe:1'
+        ], s3_key, on_progress)
+    
+    compilation_path = os.path.join(temp_dir, os.path.basename(s3_key))
+    cmd = cmd + ['-movflags', '+faststart', compilation_path]
+    print(f"Running FFmpeg command: {format_cmd(cmd)}")
+    
+    # Execute FFmpeg
+    result = run_ffmpeg(cmd, on_progress)
+    
+    if result.returncode != 0:
+        print(f"FFmpeg error: {result.stderr}")
+        raise Exception(f"FFmpeg failed: {result.stderr}")
+    
+    # Check if file exists before upload
+    if not os.path.exists(compilation_path):
+        raise Exception(f"Compilation file not found: {compilation_path}")
+    
+    # Upload file
+    print(f"📤 Uploading {compilation_path} to {S3_BUCKET}/{s3_key} in region {AWS_REGION}")
+    try:
+        s3_client.upload_file(compilation_path, S3_BUCKET, s3_key)
+        print(f"✅ Upload completed successfully")
+    except Exception as e:
+        print(f"❌ Upload failed: {e}")
+        raise
+    
+    # Verify upload by checking if object exists
+    try:
+        s3_client.head_object(Bucket=S3_BUCKET, Key=s3_key)
+        print(f"✅ Compilation uploaded and verified in S3: {s3_key}")
+    except Exception as e:
+        print(f"⚠️ Upload verification failed: {e}")
+    return {'mode': 'file', 'bytes': os.path.getsize(compilation_path)}
+
+def hls_prefix_for(compilation_key: str) -> str:
+    """
+    S3 prefix of a compilation's HLS ladder, e.g. compilations/1/20240115_hls
+    """
+    return compilation_key.rsplit('_compilation.mp4', 1)[0] + '_hls'
+
+def hls_ladder_cmd(source: str, out_dir: str, ffmpeg_path: str, ladder: List[Dict[str, Any]] = HLS_LADDER, settings: Dict[str, Any] = ENCODER_SETTINGS) -> List[str]:
+    """
+    One decode of the compilation, split and scaled into every rung, written as
+    VOD HLS with a master playlist. Keyframes are forced on segment boundaries
+    so every rung switches cleanly.
+    """
+    fps = int(TARGET_PROFILE['fps'].split('/')[0])
+    gop = fps * HLS_SEGMENT_SECONDS
+    split = f"[0:v]split={len(ladder)}" + ''.join(f"[v{i}]" for i in range(len(ladder)))
+    scales = [
+        f"[v{i}]scale={rung['width']}:{rung['height']},setsar=1[v{i}out]"
+        for i, rung in enumerate(ladder)
+    ]
+    cmd = [ffmpeg_path, '-y'] + input_args(source) + ['-filter_complex', ';'.join([split] + scales)]
+    for i, rung in enumerate(ladder):
+        cmd.extend([
+            '-map', f'[v{i}out]', '-map', '0:a:0',
+            f'-c:v:{i}', 'libx264', f'-b:v:{i}', rung['video_bitrate'],
+            f'-maxrate:v:{i}', rung['maxrate'], f'-bufsize:v:{i}', rung['bufsize'],
+            f'-c:a:{i}', 'aac', f'-b:a:{i}', rung['audio_bitrate'],
+        ])
+    cmd.extend([
+        '-preset', settings['preset'],
+        '-pix_fmt', 'yuv420p',
+        '-g', str(gop), '-keyint_min', str(gop), '-sc_threshold', '0',
+        '-ar', str(TARGET_PROFILE['sample_rate']), '-ac', str(TARGET_PROFILE['channels']),
+        '-f', 'hls',
+        '-hls_time', str(HLS_SEGMENT_SECONDS),
+        '-hls_playlist_type', 'vod',
+        '-hls_flags', 'independent_segments',
+        '-hls_segment_filename', os.path.join(out_dir, '%v', 'seg_%05d.ts'),
+        '-master_pl_name', HLS_MASTER_PLAYLIST,
+        '-var_stream_map', ' '.join(f"v:{i},a:{i},name:{rung['name']}" for i, rung in enumerate(ladder)),
+        os.path.join(out_dir, '%v', HLS_VARIANT_PLAYLIST)
+    ])
+    return cmd
+
+def upload_hls(out_dir: str, prefix: str) -> int:
+    """
+    Upload the ladder (playlists last, so a playlist never names a missing segment)
+    """
+    files = []
+    for root, _, names in os.walk(out_dir):
+        for name in names:
+            path = os.path.join(root, name)
+            files.append((path, f"{prefix}/{os.path.relpath(path, out_dir)}"))
+    segments = [f for f in files if not f[0].endswith('.m3u8')]
+    playlists = [f for f in files if f[0].endswith('.m3u8')]
+    
+    def upload(item):
+        path, key = item
+        content_type = 'application/vnd.apple.mpegurl' if path.endswith('.m3u8') else 'video/mp2t'
+        s3_client.upload_file(path, S3_BUCKET, key, ExtraArgs={'ContentType': content_type})
+    
+    with ThreadPoolExecutor(max_workers=UPLOAD_PART_CONCURRENCY) as executor:
+        list(executor.map(upload, segments))
+        list(executor.map(upload, playlists))
+    return len(files)
+
+def create_hls_ladder(source: str, compilation_key: str, temp_dir: str, ffmpeg_path: str, ladder: List[Dict[str, Any]] = HLS_LADDER, settings: Dict[str, Any] = ENCODER_SETTINGS, on_progress=None) -> Dict[str, Any]:
+    """
+    Encode the finished compilation into the HLS ladder and store it under the compilation prefix
+    """
+    started = time.monotonic()
+    prefix = hls_prefix_for(compilation_key)
+    out_dir = os.path.join(temp_dir, 'hls')
+    for rung in ladder:
+        os.makedirs(os.path.join(out_dir, rung['name']), exist_ok=True)
+    
+    cmd = hls_ladder_cmd(source, out_dir, ffmpeg_path, ladder, settings)
+    print(f"📺 Encoding HLS ladder ({', '.join(rung['name'] for rung in ladder)}): {format_cmd(cmd)}")
+    result = run_ffmpeg(cmd, on_progress)
+    if result.returncode != 0:
+        raise Exception(f"HLS encode failed: {result.stderr[-2000:]}")
+    
+    files = upload_hls(out_dir, prefix)
+    print(f"✅ HLS ladder uploaded to {prefix}/ ({files} files)")
+    return {'prefix': prefix, 'files': files, 'seconds': round(time.monotonic() - started, 3)}
+
+def vtt_timestamp(seconds: float) -> str:
+    hours, rest = divmod(seconds, 3600)
+    minutes, secs = divmod(rest, 60)
+    return f"{int(hours):02d}:{int(minutes):02d}:{secs:06.3f}"
+
+def render_thumbnails(source: str, duration: float, out_dir: str, ffmpeg_path: str) -> List[Tuple[str, str, str]]:
+    """
+    Render poster.jpg, sprite.jpg and sprite.vtt for a video. Returns
+    (path, file name, content type) for each file. Cue payloads in the VTT are
+    "sprite.jpg#xywh=x,y,w,h", relative to the sprite's own URL.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    poster_path = os.path.join(out_dir, 'poster.jpg')
+    sprite_path = os.path.join(out_dir, 'sprite.jpg')
+    vtt_path = os.path.join(out_dir, 'sprite.vtt')
+    
+    # Poster: a frame a little way in, past any fade from black
+    poster_at = min(1.0, duration / 2) if duration else 0
+    cmd = [ffmpeg_path, '-y', '-ss', f"{poster_at:.3f}"] + input_args(source) + [
+        '-frames:v', '1', '-vf', f"scale={POSTER_WIDTH}:-2", '-q:v', '4', poster_path
+    ]
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise Exception(f"Poster render failed: {result.stderr[-1000:]}")
+    
+    # Sprite: one tile every interval, laid out in a single JPEG
+    interval = max(THUMBNAIL_INTERVAL, duration / THUMBNAIL_MAX_TILES) if duration else THUMBNAIL_INTERVAL
+    tiles = max(1, int(-(-duration // interval))) if duration else 1
+    columns = min(SPRITE_COLUMNS, tiles)
+    rows = -(-tiles // columns)
+    tile_filter = (
+        f"fps=1/{interval},"
+        f"scale={THUMBNAIL_WIDTH}:{THUMBNAIL_HEIGHT}:force_original_aspect_ratio=decrease,"
+        f"pad={THUMBNAIL_WIDTH}:{THUMBNAIL_HEIGHT}:(ow-iw)/2:(oh-ih)/2,"
+        f"tile={columns}x{rows}"
+    )
+    cmd = [ffmpeg_path, '-y'] + input_args(source) + ['-vf', tile_filter, '-frames:v', '1', '-q:v', '5', sprite_path]
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise Exception(f"Sprite render failed: {result.stderr[-1000:]}")
+    
+    cues = ["WEBVTT", ""]
+    for i in range(tiles):
+        start = i * interval
+        end = min((i + 1) * interval, duration) if duration else interval
+        x = (i % columns) * THUMBNAIL_WIDTH
+        y = (i // columns) * THUMBNAIL_HEIGHT
+        cues.extend([
+            f"{vtt_timestamp(start)} --> {vtt_timestamp(end)}",
+            f"sprite.jpg#xywh={x},{y},{THUMBNAIL_WIDTH},{THUMBNAIL_HEIGHT}",
+            ""
+        ])
+    with open(vtt_path, 'w') as f:
+        f.write('\n'.join(cues))
+    
+    return [
+        (poster_path, 'poster.jpg', 'image/jpeg'),
+        (sprite_path, 'sprite.jpg', 'image/jpeg'),
+        (vtt_path, 'sprite.vtt', 'text/vtt'),
+    ]
+
+def compilation_thumbnail_prefix(compilation_key: str) -> str:
+    """
+    S3 prefix of a compilation's poster and sprite, e.g. compilations/1/20240115_thumbs
+    """
+    return compilation_key.rsplit('_compilation.mp4', 1)[0] + '_thumbs'
+
+def create_thumbnails(source: str, duration: float, prefix: str, temp_dir: str, ffmpeg_path: str) -> Dict[str, Any]:
+    """
+    Render a video's poster and sprite and upload them under prefix
+    """
+    started = time.monotonic()
+    files = render_thumbnails(source, duration, os.path.join(temp_dir, 'thumbs'), ffmpeg_path)
+    for path, name, content_type in files:
+        s3_client.upload_file(path, S3_BUCKET, f"{prefix}/{name}", ExtraArgs={'ContentType': content_type})
+    print(f"🖼️ Thumbnails uploaded to {prefix}/")
+    return {'prefix': prefix, 'seconds': round(time.monotonic() - started, 3)}
+
+def create_video_compilation(group_id: int, videos: List[Dict[str, Any]], week_start: datetime, week_end: datetime, ffmpeg_path: str, timings: Dict[str, Any] = None, music_track: Dict[str, Any] = None, context=None, progress: 'CompileProgress' = None) -> str:
     """
     Create a video compilation from the group's videos
     """
+    progress = progress or CompileProgress(None)
     try:
-        with tempfile.TemporaryDirectory() as temp_dir:
+        progress.begin('preparing')
+        
+        # Size the job before touching the disk, so one that can't fit fails before downloading anything
+        sources = inspect_sources(videos)
+        scratch = plan_scratch(videos, sources)
+        streaming = scratch['mode'] == 'stream'
+        output_mode = 'stream' if streaming else COMPILE_OUTPUT_MODE
+        if timings is not None:
+            timings['scratch'] = scratch
+        
+        with reserve_scratch(scratch), tempfile.TemporaryDirectory(dir=scratch['dir']) as temp_dir:
             print(f"Creating compilation in temporary directory: {temp_dir}")
             
-            # Download videos
-            video_files = []
-            for i, video in enumerate(videos):
-                video_path = os.path.join(temp_dir, f"video_{i}.mp4")
-                s3_client.download_file(S3_BUCKET, video['s3_key'], video_path)
-                video_files.append(video_path)
-                print(f"Downloaded: {video['s3_key']}")
+            # Stream or download the source clips
+            video_files, input_stats = resolve_inputs(videos, temp_dir, sources, stream_all=streaming)
+            if timings is not None:
+                timings['inputs'] = input_stats
             
             # Create intro card
-            intro_path = create_intro_card(group_id, week_start, week_end, temp_dir, ffmpeg_path)
+            intro_path = create_intro_card(week_start, ffmpeg_path)
             
             # Create outro card
-            outro_path = create_outro_card(temp_dir, ffmpeg_path)
+            outro_path = create_outro_card(ffmpeg_path)
             
-            # Build FFmpeg command
-            cmd = [ffmpeg_path, '-y']  # -y to overwrite output
-            
-            # Input files
+            # Input files, with the submission and stored probe of each clip (cards are cached on their own)
             input_files = []
+            clip_videos = []
+            known_probes = []
             if intro_path:
                 input_files.append(intro_path)
+                clip_videos.append(None)
+                known_probes.append(None)
             input_files.extend(video_files)
+            clip_videos.extend(videos)
+            known_probes.extend(known_probe(video) for video in videos)
             if outro_path:
                 input_files.append(outro_path)
-
-            for f in input_files:
-                cmd.extend(['-i', f])
-            
-            # Filter complex for concatenation and scaling
-            filter_parts = []
-            concat_inputs = []
-            for i, _ in enumerate(input_files):
-                filter_parts.append(f"[{i}:v]scale=1280:720:force_original_aspect_ratio=decrease,pad=1280:720:(ow-iw)/2:(oh-ih)/2,setsar=1[v{i}]")
-                filter_parts.append(f"[{i}:a]aformat=sample_fmts=fltp:sample_rates=48000:channel_layouts=stereo[a{i}]")
-                concat_inputs.append(f"[v{i}][a{i}]")
-            
-            filter_complex = ';'.join(filter_parts) + f";{''.join(concat_inputs)}concat=n={len(input_files)}:v=1:a=1[outv][outa]"
+                clip_videos.append(None)
+                known_probes.append(None)
             
             # Ensure week_start is a datetime object
             if isinstance(week_start, str):
                 week_start = datetime.fromisoformat(week_start.replace('Z', '+00:00'))
-            compilation_path = os.path.join(temp_dir, f"compilation_{group_id}_{week_start.strftime('%Y%m%d')}.mp4")
-            
-            cmd.extend([
-                '-filter_complex', filter_complex,
-                '-map', '[outv]',
-                '-map', '[outa]',
-                '-c:v', 'libx264',
-                '-c:a', 'aac',
-                '-preset', 'fast',
-                '-crf', '23',
-                compilation_path
-            ])
-            
-            print(f"Running FFmpeg command: {' '.join(cmd)}")
-            
-            # Execute FFmpeg
-            result = subprocess.run(cmd, capture_output=True, text=True)
+            compilation_key = f"compilations/{group_id}/{week_start.strftime('%Y%m%d')}_compilation.mp4"
             
-            if result.returncode != 0:
-                print(f"FFmpeg error: {result.stderr}")
-                raise Exception(f"FFmpeg failed: {result.stderr}")
+            # Inputs that already match the output profile are used as-is; the rest are
+            # re-encoded as parallel per-clip jobs. Everything is then stream-copied
+            # together. In stream output mode the upload overlaps the final pass.
+            encode_started = time.monotonic()
+            plan = plan_compilation(get_ffprobe_path(ffmpeg_path), input_files, known_probes=known_probes)
+            strategy = plan['strategy']
+            if strategy == 'segments' and COMPILE_STRATEGY == 'filter':
+                strategy = 'filter'
+            duration = sum(probe.get('duration') or 0 for probe in plan['probes'] if probe)
             
-            print("✅ Video compilation created successfully")
+            # Clips already in the segment cache cost nothing, so only the misses are budgeted
+            segment_keys = [
+                segment_cache_key(video) if video and video.get('id') else None
+                for video in clip_videos
+            ]
+            cached = set(find_cached_segments(segment_keys, plan['reencode'])) if strategy != 'filter' else set()
+            misses = [i for i in plan['reencode'] if i not in cached]
             
-            # Upload to S3
-            compilation_key = f"compilations/{group_id}/{week_start.strftime('%Y%m%d')}_compilation.mp4"
-            print(f"📤 Uploading compilation to S3: {S3_BUCKET}/{compilation_key}")
+            # Fit the encode into what is left of this invocation
+            budget = None
+            settings = ENCODER_SETTINGS
+            hls_ladder = HLS_LADDER if HLS_ENABLED else []
+            if context is not None:
+                budget = plan_encode_budget(dict(plan, reencode=misses), context.get_remaining_time_in_millis() / 1000)
+                budget['cached_clips'] = len(cached)
+                settings = budget['settings']
+                hls_ladder = budget['hls_ladder']
+            if not scratch['hls']:
+                hls_ladder = []
+            if budget:
+                print(f"⏳ Budget {budget['remaining_seconds']}s: preset {settings['preset']}, "
+                      f"HLS {', '.join(rung['name'] for rung in hls_ladder) or 'off'}, estimate {budget['estimate_seconds']}s"
+                      + (f", splitting over {budget['split']} workers" if budget['split'] else ''))
+            reencode_seconds = sum((plan['probes'][i] or {}).get('duration') or 0 for i in plan['reencode'])
+            progress.set_stages(compile_stages(strategy, bool(plan['reencode']), bool(hls_ladder)))
             
-            # Check if file exists before upload
-            if not os.path.exists(compilation_path):
-                raise Exception(f"Compilation file not found: {compilation_path}")
+            # Too much for one invocation: workers fill the segment cache, this one stitches
+            split_stats = None
+            if budget and budget['split'] and strategy != 'filter':
+                progress.begin('encoding', reencode_seconds)
+                costs = {i: encode_cost(plan['probes'][i]) for i in misses if segment_keys[i]}
+                chunks = split_jobs(list(costs), costs, budget['split'])
+                if len(chunks) > 1:
+                    split_stats = dispatch_segment_workers([[clip_videos[i] for i in chunk] for chunk in chunks], settings, context)
             
-            # Upload file
-            print(f"📤 Uploading {compilation_path} to {S3_BUCKET}/{compilation_key} in region {AWS_REGION}")
-            try:
-                s3_client.upload_file(compilation_path, S3_BUCKET, compilation_key)
-                print(f"✅ Upload completed successfully")
-            except Exception as e:
-                print(f"❌ Upload failed: {e}")
-                raise
+            # Music is mixed in the final pass; a track that can't be loaded means no music, not no video
+            music_path = None
+            if music_track:
+                try:
+                    music_path = get_music(music_track, ffmpeg_path)
+                except Exception as e:
+                    print(f"⚠️ Music track {music_track['id']} unavailable, compiling without it: {e}")
+            output_stats = None
+            segment_stats = None
+            if strategy != 'filter':
+                try:
+                    progress.begin('encoding', reencode_seconds)
+                    segment_files, segment_stats = encode_segments(input_files, plan, temp_dir, ffmpeg_path, segment_keys=segment_keys, settings=settings, progress=progress, stream_segments=streaming)
+                    progress.begin('stitching', duration)
+                    output_stats = write_output(concat_copy_cmd(segment_files, temp_dir, ffmpeg_path, music_path, duration), compilation_key, temp_dir, progress.update, output_mode)
+                except Exception as e:
+                    print(f"⚠️ Segment concat failed, falling back to a single filter graph: {e}")
+                    strategy = 'filter'
+            if strategy == 'filter':
+                progress.set_stages(compile_stages(strategy, True, bool(hls_ladder)))
+                progress.begin('encoding', duration)
+                output_stats = write_output(filter_complex_cmd(input_files, ffmpeg_path, music_path=music_path, duration=duration, settings=settings), compilation_key, temp_dir, progress.update, output_mode)
+            if timings is not None:
+                timings['encode'] = {
+                    'strategy': strategy,
+                    'music_track_id': music_track['id'] if music_path else None,
+                    'seconds': round(time.monotonic() - encode_started, 3),
+                    'budget': budget,
+                    'split': split_stats,
+                    'segments': segment_stats,
+                    'output': output_stats
+                }
             
-            # Verify upload by checking if object exists
-            try:
-                s3_client.head_object(Bucket=S3_BUCKET, Key=compilation_key)
-                print(f"✅ Compilation uploaded and verified in S3: {compilation_key}")
-            except Exception as e:
-                print(f"⚠️ Upload verification failed: {e}")
+            print("✅ Video compilation created successfully")
             
             # Generate presigned URL
             compilation_url = s3_client.generate_presigned_url(
@@ -342,6 +1931,27 @@ def create_video_compilation(group_id: int, videos: List[Dict[str, Any]], week_s
                 ExpiresIn=3600  # 1 hour
             )
             
+            # Poster and scrubbing sprite; previews are optional, so failures are only logged
+            progress.begin('thumbnails')
+            try:
+                thumbnail_stats = create_thumbnails(compilation_url, duration, compilation_thumbnail_prefix(compilation_key), temp_dir, ffmpeg_path)
+            except Exception as e:
+                print(f"⚠️ Thumbnails failed: {e}")
+                thumbnail_stats = {'error': str(e)}
+            if timings is not None:
+                timings['thumbnails'] = thumbnail_stats
+            
+            # The MP4 is the fallback for playback, so a failed ladder doesn't fail the compile
+            if hls_ladder:
+                progress.begin('hls', duration)
+                try:
+                    hls_stats = create_hls_ladder(compilation_url, compilation_key, temp_dir, ffmpeg_path, hls_ladder, settings, progress.update)
+                except Exception as e:
+                    print(f"⚠️ HLS ladder failed, the MP4 is still available: {e}")
+                    hls_stats = {'error': str(e)}
+                if timings is not None:
+                    timings['hls'] = hls_stats
+            
             print(f"✅ Compilation uploaded to S3: {compilation_key}")
             return compilation_url
             
@@ -349,76 +1959,302 @@ def create_video_compilation(group_id: int, videos: List[Dict[str, Any]], week_s
         print(f"Error creating video compilation: {e}")
         raise
 
-def create_intro_card(group_id: int, week_start: datetime, week_end: datetime, temp_dir: str, ffmpeg_path: str) -> str:
+def card_cache_key(text: str, duration: int, fontsize: int, profile: Dict[str, Any] = TARGET_PROFILE, settings: Dict[str, Any] = ENCODER_SETTINGS) -> str:
+    """
+    Content key for a rendered card: same text and encode settings give the same file
+    """
+    spec = {
+        'text': text,
+        'duration': duration,
+        'fontsize': fontsize,
+        'profile': profile,
+        'settings': settings
+    }
+    return hashlib.sha256(json.dumps(spec, sort_keys=True).encode()).hexdigest()[:32]
+
+def render_card(text: str, duration: int, fontsize: int, output_path: str, ffmpeg_path: str):
+    """
+    Render a black title card with centered text, matching the output profile
+    """
+    cmd = [
+        ffmpeg_path, '-y',
+        '-f', 'lavfi',
+        '-i', f'color=c=black:size={TARGET_PROFILE["width"]}x{TARGET_PROFILE["height"]}:duration={duration}',
+        '-f', 'lavfi',
+        '-i', f'anullsrc=channel_layout=stereo:sample_rate={TARGET_PROFILE["sample_rate"]}',
+        '-shortest',
+        '-vf', f'drawtext=text="{text}":fontcolor=white:fontsize={fontsize}:x=(w-text_w)/2:y=(h-text_h)/2',
+    ] + encoder_args() + [
+        '-movflags', '+faststart',
+        # Callers write to a .part name, so the muxer can't come from the extension
+        '-f', 'mp4',
+        output_path
+    ]
+    
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise Exception(f"FFmpeg card render failed: {result.stderr}")
+
+def get_card(text: str, duration: int, fontsize: int, ffmpeg_path: str) -> str:
+    """
+    Return a local path to the card, from /tmp, then S3, rendering it only on a miss
+    """
+    key = card_cache_key(text, duration, fontsize)
+    os.makedirs(CARD_CACHE_DIR, exist_ok=True)
+    card_path = os.path.join(CARD_CACHE_DIR, f"{key}.mp4")
+    s3_key = f"{CARD_CACHE_PREFIX}/{key}.mp4"
+    
+    if os.path.exists(card_path):
+        print(f"🃏 Card cache hit (local): {text}")
+        return card_path
+    
+    # Write to a private name first (per process and thread: the local executor runs
+    # several compile processes on one cache dir) so no compile reads a partial file
+    partial_path = f"{card_path}.{os.getpid()}.{threading.get_ident()}.part"
+    try:
+        s3_client.download_file(S3_BUCKET, s3_key, partial_path)
+        os.replace(partial_path, card_path)
+        print(f"🃏 Card cache hit (S3): {text}")
+        return card_path
+    except Exception:
+        pass
+    
+    render_card(text, duration, fontsize, partial_path, ffmpeg_path)
+    os.replace(partial_path, card_path)
+    print(f"🃏 Card rendered: {text}")
+    
+    try:
+        s3_client.upload_file(card_path, S3_BUCKET, s3_key)
+    except Exception as e:
+        print(f"⚠️ Could not store card in S3 cache: {e}")
+    return card_path
+
+def get_music_track(compilation_id: int):
+    """
+    The active music track chosen for a compilation, or None
+    """
+    if not compilation_id or not DATABASE_URL:
+        return None
+    query = """
+    SELECT mt.id, mt.s3_key
+    FROM weekly_compilations wc
+    JOIN music_tracks mt ON mt.id = wc.music_track_id
+    WHERE wc.id = %s AND mt.is_active
+    """
+    try:
+        with db.cursor(dict_rows=True) as cursor:
+            cursor.execute(query, (compilation_id,))
+            track = cursor.fetchone()
+        return dict(track) if track else None
+    except Exception as e:
+        print(f"⚠️ Could not look up the music track: {e}")
+        return None
+
+def render_music(source: str, output_path: str, ffmpeg_path: str, profile: Dict[str, Any] = TARGET_PROFILE):
+    """
+    Decode a track to PCM at the output sample rate and channel count
+    """
+    cmd = [ffmpeg_path, '-y'] + input_args(source) + [
+        '-vn', '-map', '0:a:0',
+        '-c:a', 'pcm_s16le', '-ar', str(profile['sample_rate']), '-ac', str(profile['channels']),
+        '-f', 'wav', output_path
+    ]
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise Exception(f"Music decode failed: {result.stderr[-1000:]}")
+
+def get_music(track: Dict[str, Any], ffmpeg_path: str, profile: Dict[str, Any] = TARGET_PROFILE) -> str:
+    """
+    Return a local path to the decoded track, from /tmp, then S3, decoding it only on a miss
+    """
+    # The source key is part of the name so a replaced file is decoded again
+    spec = {'source': track['s3_key'], 'sample_rate': profile['sample_rate'], 'channels': profile['channels']}
+    digest = hashlib.sha256(json.dumps(spec, sort_keys=True).encode()).hexdigest()[:16]
+    os.makedirs(MUSIC_CACHE_DIR, exist_ok=True)
+    music_path = os.path.join(MUSIC_CACHE_DIR, f"{track['id']}_{digest}.wav")
+    s3_key = f"{MUSIC_CACHE_PREFIX}/{track['id']}/{digest}.wav"
+    
+    if os.path.exists(music_path):
+        print(f"🎵 Music cache hit (local): track {track['id']}")
+        return music_path
+    
+    # Write to a private name first (per process and thread: the local executor runs
+    # several compile processes on one cache dir) so no compile reads a partial file
+    partial_path = f"{music_path}.{os.getpid()}.{threading.get_ident()}.part"
+    try:
+        s3_client.download_file(S3_BUCKET, s3_key, partial_path)
+        os.replace(partial_path, music_path)
+        print(f"🎵 Music cache hit (S3): track {track['id']}")
+        return music_path
+    except Exception:
+        pass
+    
+    source = s3_client.generate_presigned_url(
+        'get_object',
+        Params={'Bucket': S3_BUCKET, 'Key': track['s3_key']},
+        ExpiresIn=INPUT_URL_EXPIRY
+    )
+    render_music(source, partial_path, ffmpeg_path, profile)
+    os.replace(partial_path, music_path)
+    print(f"🎵 Music decoded: track {track['id']}")
+    
+    try:
+        s3_client.upload_file(music_path, S3_BUCKET, s3_key)
+    except Exception as e:
+        print(f"⚠️ Could not store music in S3 cache: {e}")
+    return music_path
+
+def intro_text_for(week_start: datetime) -> str:
+    return f"Week of {week_start.strftime('%B %d, %Y')}"
+
+def create_intro_card(week_start: datetime, ffmpeg_path: str) -> str:
     """
     Create an intro card for the compilation
     """
     try:
-        intro_path = os.path.join(temp_dir, "intro.mp4")
-        
-        # Create intro text
         # Ensure week_start is a datetime object
         if isinstance(week_start, str):
             week_start = datetime.fromisoformat(week_start.replace('Z', '+00:00'))
-        intro_text = f"Week of {week_start.strftime('%B %d, %Y')}"
-        
-        # Create intro video using FFmpeg
-        cmd = [
-            ffmpeg_path, '-y',
-            '-f', 'lavfi',
-            '-i', f'color=c=black:size=1280x720:duration=3',
-            '-vf', f'drawtext=text="{intro_text}":fontcolor=white:fontsize=48:x=(w-text_w)/2:y=(h-text_h)/2',
-            '-c:v', 'libx264',
-            '-preset', 'fast',
-            intro_path
-        ]
-        
-        result = subprocess.run(cmd, capture_output=True, text=True)
-        if result.returncode == 0:
-            print("✅ Intro card created")
-            return intro_path
-        else:
-            print(f"⚠️ Intro card creation failed: {result.stderr}")
-            return None
+        intro_path = get_card(intro_text_for(week_start), 3, 48, ffmpeg_path)
+        print("✅ Intro card created")
+        return intro_path
             
     except Exception as e:
         print(f"Error creating intro card: {e}")
         return None
 
-def create_outro_card(temp_dir: str, ffmpeg_path: str) -> str:
+def create_outro_card(ffmpeg_path: str) -> str:
     """
     Create an outro card for the compilation
     """
     try:
-        outro_path = os.path.join(temp_dir, "outro.mp4")
-        
-        # Create outro text
-        outro_text = "Created with Weave"
-        
-        # Create outro video using FFmpeg
-        cmd = [
-            ffmpeg_path, '-y',
-            '-f', 'lavfi',
-            '-i', f'color=c=black:size=1280x720:duration=2',
-            '-vf', f'drawtext=text="{outro_text}":fontcolor=white:fontsize=36:x=(w-text_w)/2:y=(h-text_h)/2',
-            '-c:v', 'libx264',
-            '-preset', 'fast',
-            outro_path
-        ]
-        
-        result = subprocess.run(cmd, capture_output=True, text=True)
-        if result.returncode == 0:
-            print("✅ Outro card created")
-            return outro_path
-        else:
-            print(f"⚠️ Outro card creation failed: {result.stderr}")
-            return None
+        outro_path = get_card(OUTRO_TEXT, 2, 36, ffmpeg_path)
+        print("✅ Outro card created")
+        return outro_path
             
     except Exception as e:
         print(f"Error creating outro card: {e}")
         return None
 
-def update_compilation_status(compilation_id: int, status: str, s3_key: str = None):
+def prerender_week_cards(ffmpeg_path: str, now: datetime = None) -> List[str]:
+    """
+    Warm the card cache for the week that just closed and the week that starts now
+    """
+    now = now or datetime.now()
+    this_week = (now - timedelta(days=now.weekday())).replace(hour=0, minute=0, second=0, microsecond=0)
+    rendered = []
+    for week_start in (this_week - timedelta(days=7), this_week):
+        if create_intro_card(week_start, ffmpeg_path):
+            rendered.append(intro_text_for(week_start))
+    if create_outro_card(ffmpeg_path):
+        rendered.append(OUTRO_TEXT)
+    return rendered
+
+class CompileProgress:
+    """
+    Progress of one compile: the current stage, how many seconds of its media
+    ffmpeg has encoded, and an overall percent and ETA. Updates come from many
+    threads (parallel segment jobs, stderr readers) and are written to the
+    database at most once per PROGRESS_UPDATE_SECONDS; stage changes always are.
+    With no compilation_id nothing is written.
+    """
+    def __init__(self, compilation_id: int = None, stages: List[str] = None):
+        self.compilation_id = compilation_id
+        self.lock = threading.Lock()
+        self.started = time.monotonic()
+        self.last_write = 0.0
+        self.stage = None
+        self.stage_seconds = 0.0
+        self.encoded = {}
+        self.set_stages(stages or list(PROGRESS_STAGE_WEIGHTS))
+
+    def set_stages(self, stages: List[str]):
+        """The stages this compile will run, in order; skipped stages don't count toward the percent"""
+        with self.lock:
+            total = sum(PROGRESS_STAGE_WEIGHTS[stage] for stage in stages)
+            self.stages = list(stages)
+            self.weights = {stage: PROGRESS_STAGE_WEIGHTS[stage] / total for stage in stages}
+
+    def begin(self, stage: str, stage_seconds: float = 0):
+        """Enter a stage that will encode stage_seconds of media"""
+        with self.lock:
+            self.stage = stage
+            self.stage_seconds = stage_seconds
+            self.encoded = {}
+            self._write(force=True)
+
+    def update(self, seconds: float, key=None):
+        """Seconds encoded so far by one job (key) of the current stage"""
+        with self.lock:
+            self.encoded[key] = seconds
+            self._write()
+
+    def finish(self):
+        with self.lock:
+            self.stage = 'done'
+            self._write(force=True)
+
+    def snapshot(self) -> Dict[str, Any]:
+        encoded = sum(self.encoded.values())
+        if self.stage == 'done':
+            percent = 100.0
+        else:
+            fraction = min(1.0, encoded / self.stage_seconds) if self.stage_seconds else 0.0
+            position = self.stages.index(self.stage) if self.stage in self.stages else 0
+            done = sum(self.weights[stage] for stage in self.stages[:position])
+            # Durations are estimates; only finish() reports 100
+            percent = min(99.0, 100 * (done + self.weights.get(self.stage, 0) * fraction))
+        elapsed = time.monotonic() - self.started
+        # Extrapolate from the whole compile so far; too early to tell below 1%
+        eta = int(elapsed * (100 - percent) / percent) if percent >= 1 else None
+        return {
+            'stage': self.stage,
+            'percent': round(percent, 1),
+            'encoded_seconds': round(encoded, 1),
+            'stage_seconds': round(self.stage_seconds, 1),
+            'elapsed_seconds': int(elapsed),
+            'eta_seconds': eta,
+            'updated_at': datetime.utcnow().isoformat() + 'Z'
+        }
+
+    def _write(self, force: bool = False):
+        now = time.monotonic()
+        if not force and now - self.last_write < PROGRESS_UPDATE_SECONDS:
+            return
+        self.last_write = now
+        if self.compilation_id:
+            write_compilation_progress(self.compilation_id, self.snapshot())
+
+def compile_stages(strategy: str, reencode: bool, hls: bool) -> List[str]:
+    """
+    Stages a compile runs: the filter strategy encodes and stitches in one pass,
+    the segment strategy only encodes when some input doesn't match the profile
+    """
+    return (
+        ['preparing']
+        + (['encoding'] if strategy == 'filter' or reencode else [])
+        + (['stitching'] if strategy != 'filter' else [])
+        + ['thumbnails']
+        + (['hls'] if hls else [])
+    )
+
+def write_compilation_progress(compilation_id: int, progress: Dict[str, Any]):
+    """
+    Store a progress snapshot for the status endpoint. Progress is advisory, so
+    failures are only logged, and rows that already left 'processing' are left alone.
+    """
+    if not DATABASE_URL:
+        return
+    try:
+        with db.cursor() as cursor:
+            cursor.execute(
+                "UPDATE weekly_compilations SET progress = %s WHERE id = %s AND status = 'processing'",
+                (json.dumps(progress), compilation_id)
+            )
+    except Exception as e:
+        print(f"⚠️ Could not record progress for compilation {compilation_id}: {e}")
+
+def update_compilation_status(compilation_id: int, status: str, s3_key: str = None, thumbnail_prefix: str = None):
     """
     Update compilation status in database
     """
@@ -429,29 +2265,14 @@ def update_compilation_status(compilation_id: int, status: str, s3_key: str = No
         
         print(f"📝 Updating compilation {compilation_id} status to {status}")
         
-        # Connect to database
-        conn = psycopg2.connect(DATABASE_URL)
-        cursor = conn.cursor()
-        
-        # Update compilation status
-        if s3_key:
-            query = """
-            UPDATE weekly_compilations 
-            SET status = %s, s3_key = %s, completed_at = NOW()
-            WHERE id = %s
-            """
-            cursor.execute(query, (status, s3_key, compilation_id))
-        else:
-            query = """
-            UPDATE weekly_compilations 
-            SET status = %s, completed_at = NOW()
-            WHERE id = %s
-            """
-            cursor.execute(query, (status, compilation_id))
-        
-        conn.commit()
-        cursor.close()
-        conn.close()
+        # One statement whether or not there is a new key
+        query = """
+        UPDATE weekly_compilations 
+        SET status = %s, s3_key = COALESCE(%s, s3_key), thumbnail_prefix = COALESCE(%s, thumbnail_prefix), completed_at = NOW()
+        WHERE id = %s
+        """
+        with db.cursor() as cursor:
+            cursor.execute(query, (status, s3_key, thumbnail_prefix, compilation_id))
         
         print(f"✅ Updated compilation {compilation_id} status to {status}")
         
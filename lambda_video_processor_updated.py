@@ -9,9 +9,14 @@ import os
 import boto3
 import subprocess
 import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Tuple
 import psycopg2
+from botocore.config import Config
+from boto3.s3.transfer import TransferConfig
 from psycopg2.extras import RealDictCursor
 
 # AWS Configuration
@@ -19,8 +24,20 @@ S3_BUCKET = os.environ.get('S3_BUCKET', 'weave-videos')
 AWS_REGION = os.environ.get('AWS_REGION', 'us-east-1')  # Automatically provided by Lambda
 DATABASE_URL = os.environ.get('DATABASE_URL')
 
+# Source clip download tuning
+DOWNLOAD_CONCURRENCY = int(os.environ.get('DOWNLOAD_CONCURRENCY', '8'))  # Clips fetched at once
+DOWNLOAD_PART_CONCURRENCY = int(os.environ.get('DOWNLOAD_PART_CONCURRENCY', '4'))  # Ranged GETs per clip
+DOWNLOAD_BYTE_BUDGET_MB = int(os.environ.get('DOWNLOAD_BYTE_BUDGET_MB', '512'))  # Max bytes in flight across all clips
+DOWNLOAD_MAX_ATTEMPTS = int(os.environ.get('DOWNLOAD_MAX_ATTEMPTS', '3'))
+
 # Initialize AWS clients
-s3_client = boto3.client('s3', region_name=AWS_REGION)
+# The connection pool has to cover every ranged GET of every concurrent download
+s3_client = boto3.client(
+    's3',
+    region_name=AWS_REGION,
+    config=Config(max_pool_connections=DOWNLOAD_CONCURRENCY * DOWNLOAD_PART_CONCURRENCY)
+)
+download_transfer_config = TransferConfig(max_concurrency=DOWNLOAD_PART_CONCURRENCY)
 
 def lambda_handler(event, context):
     """
@@ -75,7 +92,7 @@ def lambda_handler(event, context):
             'body': json.dumps({
                 'message': 'Video compilation completed',
                 'result': result
-            })
+            }, default=str)
         }
         
     except Exception as e:
@@ -107,7 +124,8 @@ def process_group_videos(group_id: int, week_start: datetime, week_end: datetime
         print(f"Found {len(videos)} videos for group {group_id}")
         
         # Create compilation
-        compilation_url = create_video_compilation(group_id, videos, week_start, week_end, ffmpeg_path)
+        timings = {}
+        compilation_url = create_video_compilation(group_id, videos, week_start, week_end, ffmpeg_path, timings)
         
         # Update compilation status in database
         if compilation_id:
@@ -117,7 +135,8 @@ def process_group_videos(group_id: int, week_start: datetime, week_end: datetime
             'group_id': group_id,
             'status': 'success',
             'compilation_url': compilation_url,
-            'video_count': len(videos)
+            'video_count': len(videos),
+            'timings': timings
         }
         
     except Exception as e:
@@ -226,7 +245,80 @@ def update_compilation_status(compilation_id: int, status: str, s3_key: str = No
     except Exception as e:
         print(f"Error updating compilation status: {e}")
 
-def create_video_compilation(group_id: int, videos: List[Dict[str, Any]], week_start: datetime, week_end: datetime, ffmpeg_path: str) -> str:
+class ByteBudget:
+    """
+    Caps how many bytes are being downloaded at once across all workers
+    """
+    def __init__(self, limit_bytes: int):
+        self.limit_bytes = limit_bytes
+        self.in_flight = 0
+        self._cond = threading.Condition()
+
+    def acquire(self, size: int):
+        with self._cond:
+            # A clip bigger than the whole budget is still let through once nothing else is running
+            while self.in_flight > 0 and self.in_flight + size > self.limit_bytes:
+                self._cond.wait()
+            self.in_flight += size
+
+    def release(self, size: int):
+        with self._cond:
+            self.in_flight -= size
+            self._cond.notify_all()
+
+def download_video(s3_key: str, video_path: str, budget: ByteBudget) -> Dict[str, Any]:
+    """
+    Download one source clip, retrying with backoff, and report how long it took
+    """
+    size = s3_client.head_object(Bucket=S3_BUCKET, Key=s3_key)['ContentLength']
+    budget.acquire(size)
+    try:
+        for attempt in range(1, DOWNLOAD_MAX_ATTEMPTS + 1):
+            started = time.monotonic()
+            try:
+                s3_client.download_file(S3_BUCKET, s3_key, video_path, Config=download_transfer_config)
+                elapsed = time.monotonic() - started
+                print(f"Downloaded: {s3_key} ({size / 1e6:.1f} MB in {elapsed:.2f}s, attempt {attempt})")
+                return {'s3_key': s3_key, 'bytes': size, 'seconds': elapsed, 'attempts': attempt}
+            except Exception as e:
+                if attempt == DOWNLOAD_MAX_ATTEMPTS:
+                    raise Exception(f"Download of {s3_key} failed after {attempt} attempts: {e}")
+                backoff = 0.5 * (2 ** (attempt - 1))
+                print(f"⚠️ Download of {s3_key} failed (attempt {attempt}): {e}, retrying in {backoff:.1f}s")
+                time.sleep(backoff)
+    finally:
+        budget.release(size)
+
+def download_videos(videos: List[Dict[str, Any]], temp_dir: str) -> Tuple[List[str], Dict[str, Any]]:
+    """
+    Download all source clips concurrently, keeping them in submission order
+    """
+    started = time.monotonic()
+    budget = ByteBudget(DOWNLOAD_BYTE_BUDGET_MB * 1024 * 1024)
+    video_files = [os.path.join(temp_dir, f"video_{i}.mp4") for i in range(len(videos))]
+
+    with ThreadPoolExecutor(max_workers=max(1, min(DOWNLOAD_CONCURRENCY, len(videos)))) as executor:
+        futures = [
+            executor.submit(download_video, video['s3_key'], video_path, budget)
+            for video, video_path in zip(videos, video_files)
+        ]
+        clips = [future.result() for future in futures]
+
+    wall_seconds = time.monotonic() - started
+    total_bytes = sum(clip['bytes'] for clip in clips)
+    serial_seconds = sum(clip['seconds'] for clip in clips)
+    print(f"📥 Downloaded {len(clips)} clips ({total_bytes / 1e6:.1f} MB) in {wall_seconds:.2f}s "
+          f"(sum of clip times {serial_seconds:.2f}s, concurrency {DOWNLOAD_CONCURRENCY})")
+
+    return video_files, {
+        'wall_seconds': round(wall_seconds, 3),
+        'serial_seconds': round(serial_seconds, 3),
+        'bytes': total_bytes,
+        'retries': sum(clip['attempts'] - 1 for clip in clips),
+        'clips': clips
+    }
+
+def create_video_compilation(group_id: int, videos: List[Dict[str, Any]], week_start: datetime, week_end: datetime, ffmpeg_path: str, timings: Dict[str, Any] = None) -> str:
     """
     Create a video compilation from the group's videos
     """
@@ -235,12 +327,9 @@ def create_video_compilation(group_id: int, videos: List[Dict[str, Any]], week_s
             print(f"Creating compilation in temporary directory: {temp_dir}")
             
             # Download videos
-            video_files = []
-            for i, video in enumerate(videos):
-                video_path = os.path.join(temp_dir, f"video_{i}.mp4")
-                s3_client.download_file(S3_BUCKET, video['s3_key'], video_path)
-                video_files.append(video_path)
-                print(f"Downloaded: {video['s3_key']}")
+            video_files, download_stats = download_videos(videos, temp_dir)
+            if timings is not None:
+                timings['download'] = download_stats
             
             # Create intro card
             intro_path = create_intro_card(group_id, week_start, week_end, temp_dir, ffmpeg_path)